@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import statistics
+import subprocess
+import sys
+
+# every measurement runs in a fresh interpreter, so nothing is cached in sys.modules
+IMPORT = """
+import time
+start = time.perf_counter()
+from basicmemnet import memnet
+end = time.perf_counter()
+print(end - start)
+"""
+
+CONSTRUCT = """
+import time
+from basicmemnet import memnet
+start = time.perf_counter()
+for i in range(1000):
+    memnet.DSL()
+end = time.perf_counter()
+print((end - start) / 1000)
+"""
+
+HEAVY_MODULES = """
+import sys
+from basicmemnet import memnet
+memnet.DSL().create_linked_node(None, {"uuid": "1", "type": "object"})
+print(" ".join(m for m in ["nltk", "matplotlib", "bson"] if m in sys.modules))
+"""
+
+
+def run(code):
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def measure(code, repeat):
+    return statistics.median(float(run(code)) for _ in range(repeat))
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"import basicmemnet.memnet: {measure(IMPORT, repeat) * 1000:.1f} ms")
+    print(f"DSL(): {measure(CONSTRUCT, repeat) * 1e6:.1f} us")
+    print(f"heavy modules loaded: {run(HEAVY_MODULES) or 'none'}")
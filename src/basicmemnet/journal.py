@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import networkx as nx
+import bson
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+# record layout: payload length, crc32 of op code and payload, op code, bson payload
+RECORD_HEADER = struct.Struct("<IIB")
+JOURNAL_MAGIC = b"MNJ1"
+JOURNAL_HEADER = struct.Struct("<4sQ")
+
+OP_CREATE_LINKED_NODE = 1
+OP_ADD_EDGE = 2
+OP_DELETE_NODES = 3
+
+
+class Journal:
+    # write-ahead journal with snapshot compaction
+    #
+    # The directory holds one snapshot (gml, the graph attribute "generation" tells
+    # which journals are already folded into it) and the journal files
+    # journal.<generation>.bin. Recovery loads the snapshot and replays all journals
+    # of the same or a newer generation on top of it.
+    def __init__(self, directory, group_size=64, commit_interval=1.0):
+        self.directory = directory
+        self.group_size = group_size
+        self.commit_interval = commit_interval
+        self.snapshot_file = os.path.join(directory, "snapshot.gml")
+        self.generation = 0
+        self._file = None
+        self._pending = []
+        self._last_commit = time.monotonic()
+        self._lock = threading.RLock()
+        self._compaction = None
+        self._closed = threading.Event()
+        self._flusher = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _journal_file(self, generation):
+        return os.path.join(self.directory, f"journal.{generation}.bin")
+
+    def _journal_generations(self):
+        generations = []
+        for file_name in os.listdir(self.directory):
+            match = re.fullmatch(r"journal\.(\d+)\.bin", file_name)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    # load the last snapshot (or start from graph if there is none) and replay the journal
+    def recover(self, graph=None):
+        with self._lock:
+            has_snapshot = os.path.exists(self.snapshot_file)
+            if has_snapshot:
+                graph = nx.read_gml(self.snapshot_file)
+                snapshot_generation = int(graph.graph.pop("generation", 0))
+            else:
+                graph = nx.DiGraph() if graph is None else graph
+                snapshot_generation = 0
+
+            generation = snapshot_generation
+            for journal_generation in self._journal_generations():
+                journal_file = self._journal_file(journal_generation)
+                if journal_generation < snapshot_generation:
+                    # already folded into the snapshot
+                    os.remove(journal_file)
+                    continue
+                for op, payload in self._read_records(journal_file):
+                    self.apply(graph, op, payload)
+                generation = journal_generation
+
+            self._open(generation)
+            # a given start graph may not be rebuilt identically on the next start
+            # (e.g. new uuids of the WordNet graph), the journal refers to this one
+            if not has_snapshot and len(graph):
+                self.compact(graph, background=False)
+            if self._flusher is None and self.commit_interval:
+                self._flusher = threading.Thread(target=self._flush, daemon=True)
+                self._flusher.start()
+            return graph
+
+    # commit pending records at the latest commit_interval seconds after they were
+    # appended, also if no further write follows
+    def _flush(self):
+        while not self._closed.wait(self.commit_interval):
+            with self._lock:
+                if self._file is not None and self._pending:
+                    self.commit()
+
+    def _read_records(self, journal_file):
+        with open(journal_file, "rb") as file:
+            data = file.read()
+        records = []
+        offset = JOURNAL_HEADER.size
+        if len(data) < offset or data[:4] != JOURNAL_MAGIC:
+            valid_size = 0
+        else:
+            valid_size = offset
+            while offset + RECORD_HEADER.size <= len(data):
+                length, crc, op = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                payload = data[start : start + length]
+                if len(payload) < length or zlib.crc32(bytes([op]) + payload) != crc:
+                    break
+                records.append((op, bson.loads(payload)))
+                offset = start + length
+                valid_size = offset
+        if valid_size < len(data):
+            # drop a torn write at the end of the journal
+            with open(journal_file, "r+b") as file:
+                file.truncate(valid_size)
+        return records
+
+    def _open(self, generation):
+        if self._file is not None:
+            self._file.close()
+        self.generation = generation
+        journal_file = self._journal_file(generation)
+        self._file = open(journal_file, "ab")
+        if self._file.tell() == 0:
+            self._file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, generation))
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def apply(graph, op, payload):
+        if op == OP_CREATE_LINKED_NODE:
+            node_attributes = payload["node_attributes"]
+            graph.add_node(node_attributes["uuid"], **node_attributes)
+            if payload["parent_uuid"]:
+                graph.add_edge(
+                    payload["parent_uuid"],
+                    node_attributes["uuid"],
+                    link_type=payload["link_type"],
+                )
+        elif op == OP_ADD_EDGE:
+            graph.add_edge(
+                payload["source"], payload["target"], **payload["attributes"]
+            )
+        elif op == OP_DELETE_NODES:
+            graph.remove_nodes_from(payload["nodes"])
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
+
+    def append(self, op, payload):
+        data = bson.dumps(payload)
+        record = RECORD_HEADER.pack(len(data), zlib.crc32(bytes([op]) + data), op)
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("Journal is not opened, call recover() first")
+            self._pending.append(record + data)
+            if (
+                len(self._pending) >= self.group_size
+                or time.monotonic() - self._last_commit >= self.commit_interval
+            ):
+                self.commit()
+
+    def log_create_linked_node(self, parent_uuid, node_attributes, link_type=""):
+        self.append(
+            OP_CREATE_LINKED_NODE,
+            {
+                "parent_uuid": parent_uuid,
+                "node_attributes": node_attributes,
+                "link_type": link_type,
+            },
+        )
+
+    def log_add_edge(self, source, target, **attributes):
+        self.append(
+            OP_ADD_EDGE, {"source": source, "target": target, "attributes": attributes}
+        )
+
+    def log_delete_nodes(self, nodes):
+        self.append(OP_DELETE_NODES, {"nodes": list(nodes)})
+
+    # group commit: write all pending records with a single fsync
+    def commit(self):
+        with self._lock:
+            if self._pending:
+                self._file.write(b"".join(self._pending))
+                self._pending = []
+                self._sync()
+            self._last_commit = time.monotonic()
+
+    # fold the journal into a new snapshot, new records go to the next journal meanwhile
+    def compact(self, graph, background=True):
+        with self._lock:
+            self.wait_for_compaction()
+            self.commit()
+            snapshot = graph.copy()
+            generation = self.generation + 1
+            self._open(generation)
+
+        if background:
+            self._compaction = threading.Thread(
+                target=self._write_snapshot, args=(snapshot, generation), daemon=True
+            )
+            self._compaction.start()
+        else:
+            self._write_snapshot(snapshot, generation)
+
+    def _write_snapshot(self, snapshot, generation):
+        snapshot.graph["generation"] = generation
+        temp_file = self.snapshot_file + ".tmp"
+        nx.write_gml(snapshot, temp_file)
+        with open(temp_file, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.snapshot_file)
+        for journal_generation in self._journal_generations():
+            if journal_generation < generation:
+                os.remove(self._journal_file(journal_generation))
+
+    def wait_for_compaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.wait_for_compaction()
+        with self._lock:
+            if self._file is not None:
+                self.commit()
+                self._file.close()
+                self._file = None
@@ -36,32 +36,96 @@
 
 import networkx as nx
 from networkx.algorithms import isomorphism
-from basicmemnet import word2memnet
-from bson import ObjectId
+from basicmemnet import planner
+import contextlib
+import functools
+import itertools
 import json
 import copy
+import os
+import threading
+import time
 
 # TODO: _find_isomorphic_subgraphs including has_tool / has_object ... links
 
+# word2memnet (nltk), journal, bson and multiprocessing are imported on first use
+# to keep `import basicmemnet.memnet` and the construction of a DSL fast
+
+
+# serialize a method with all other writers and publish a new graph version
+def _writes(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._version += 1
+
+    return wrapper
+
+
+# parse one gml file, runs in the worker processes of DSL.merge_gml
+def _read_gml_file(graph_file):
+    graph = nx.read_gml(graph_file)
+    return list(graph.nodes(data=True)), list(graph.edges(data=True))
+
+
+# identities of a node across graph files, nodes sharing any of them are unified
+def _merge_keys(node, attributes, merge_keys):
+    keys = []
+    for key in merge_keys:
+        value = attributes.get(key)
+        if isinstance(value, list):
+            value = value[0] if len(value) == 1 else tuple(value)
+        if value:
+            keys.append((key, value))
+    return keys or [(None, node)]
+
 
 class DSL:
-    def __init__(self, use_wordnet=False, json_file=None):
-        #  define role and memory types
-        self.role_types = ["action", "object", "tool", "location", "time", "agent"]
-        self.memory_types = ["stm", "ltm", "mtm", None]
-        # create interface function for all possible combinations above with pattern
-        # get_<memory_type>_<role_type>
-        self._add_dynamic_methods()
+    #  define role and memory types
+    role_types = ["action", "object", "tool", "location", "time", "agent"]
+    memory_types = ["stm", "ltm", "mtm", None]
+
+    def __init__(
+        self,
+        use_wordnet=False,
+        json_file=None,
+        journal_dir=None,
+        snapshot_interval=0.0,
+        use_planner=True,
+    ):
+        # writers are serialized, readers query immutable snapshots of a graph version,
+        # a snapshot is reused for snapshot_interval seconds even if the graph changed
+        self._write_lock = threading.RLock()
+        self._version = 0
+        self._snapshot = None
+        # nodes and edges whose dicts the writers copied since the last snapshot, None
+        # if no snapshot shares dicts with the graph
+        self._owned = None
+        self.snapshot_interval = snapshot_interval
+        # queries are matched in the order of a cost-based plan from attribute value
+        # statistics, otherwise by the networkx subgraph matcher
+        self.use_planner = use_planner
+        self._statistics = None
 
         # create either an empty graph or initialized from installed WordNet python package
         if use_wordnet:
+            from basicmemnet import word2memnet
+
             self.graph = word2memnet.create_wordnet_graph()
         else:
             self.graph = nx.DiGraph()
+        # optionally persist all changes in a write-ahead journal
+        self.journal = None
+        if journal_dir:
+            self.open_journal(journal_dir)
         # optionally load predefined action patterns
         if json_file:
             self.load_from_json(json_file)
 
+    @_writes
     def load_from_json(self, file_path):
         print(f"loading {file_path} ...")
         with open(file_path, "r") as file:
@@ -79,11 +143,104 @@ class DSL:
         nx.write_gml(self.graph, graph_file)
 
     # import graph from gml format
+    @_writes
     def import_gml(self, graph_file):
         self.graph = nx.read_gml(graph_file)
+        self._owned = None
+        self._statistics = None
+        # the journal can not replay a replaced graph, start from a new snapshot
+        if self.journal:
+            self.compact_journal(background=False)
+
+    # merge many gml files (e.g. one per episode) into the graph. Files are parsed in
+    # a process pool, nodes with the same uuid or accessid (shared agents, LTM
+    # concepts) are unified with each other and with nodes already in the graph.
+    @_writes
+    def merge_gml(self, graph_files, workers=None, merge_keys=("accessid", "uuid")):
+        canonical = {}
+
+        def unify(node, attributes):
+            keys = _merge_keys(node, attributes, merge_keys)
+            target = next((canonical[key] for key in keys if key in canonical), node)
+            for key in keys:
+                canonical.setdefault(key, target)
+            return target
 
+        for node, attributes in self.graph.nodes(data=True):
+            unify(node, attributes)
 
-    def _find_sub_graphs(self, return_type="action", memory=None, **attributes):
+        graph_files = list(graph_files)
+        workers = min(workers or os.cpu_count() or 1, len(graph_files))
+        if workers <= 1:
+            parsed = map(_read_gml_file, graph_files)
+            executor = None
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(max_workers=workers)
+            # several small files per task to keep the inter-process overhead low
+            chunk_size = max(1, len(graph_files) // (4 * workers))
+            parsed = executor.map(_read_gml_file, graph_files, chunksize=chunk_size)
+
+        merged = nx.DiGraph()
+        try:
+            for nodes, edges in parsed:
+                local = {}
+                for node, attributes in nodes:
+                    local[node] = unify(node, attributes)
+                # unified nodes keep the uuid of the node they are merged into
+                merged.add_nodes_from(
+                    (
+                        local[node],
+                        (
+                            {**attributes, "uuid": local[node]}
+                            if local[node] != node and "uuid" in attributes
+                            else attributes
+                        ),
+                    )
+                    for node, attributes in nodes
+                )
+                merged.add_edges_from(
+                    (local[source], local[target], attributes)
+                    for source, target, attributes in edges
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+        self._merge_graph(merged)
+        self._statistics = None
+        # a new snapshot is faster to write and replay than one record per node
+        if self.journal:
+            self.compact_journal(background=False)
+
+    def _merge_graph(self, graph):
+        self._own(graph)
+        for source, target in graph.edges:
+            self._own_edge(source, target)
+        self.graph.update(graph)
+
+    # recover the graph from the journal directory and log all further changes there
+    @_writes
+    def open_journal(self, journal_dir, **kwargs):
+        from basicmemnet import journal
+
+        self.journal = journal.Journal(journal_dir, **kwargs)
+        # recovery changes the graph in place, snapshots keep their version
+        graph = self.graph if self._owned is None else self.graph.copy()
+        self.graph = self.journal.recover(graph)
+        self._owned = None
+        self._statistics = None
+
+    # fold the journal into a new snapshot
+    def compact_journal(self, background=True):
+        with self._write_lock:
+            self.journal.compact(self.graph, background=background)
+
+    def close_journal(self):
+        self.journal.close()
+        self.journal = None
+
+    def _query_attributes(self, memory, attributes):
         attributes_copy = copy.deepcopy(attributes)
         for type_name in attributes_copy:
             if (
@@ -92,17 +249,122 @@ class DSL:
             ):
                 raise ValueError("Invalid attribute name: " + type_name)
             attributes_copy[type_name].update({"memory": memory})
+        return attributes_copy
+
+    def _find_sub_graphs(
+        self, return_type="action", memory=None, unique=True, **attributes
+    ):
+        attributes_copy = self._query_attributes(memory, attributes)
         sub_graphs = self._find_isomorphic_subgraphs(**attributes_copy)
-        expanded_sub_graphs = self._expand_to_full_pattern(sub_graphs, return_type)
+        expanded_sub_graphs = self._expand_to_full_pattern(
+            sub_graphs, return_type, unique=unique
+        )
 
         return expanded_sub_graphs
-    
+
     def get_graph(self):
         return self.graph
 
+    # read-only DSL on a frozen copy of the current graph version, safe to query while
+    # other threads keep writing. The copy is shared by all readers of that version.
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            version, created, view = snapshot
+            if (
+                version == self._version
+                or time.monotonic() - created < self.snapshot_interval
+            ):
+                return view
+        with self._write_lock:
+            if self._snapshot is None or self._snapshot[0] != self._version:
+                view = copy.copy(self)
+                view.graph = self._snapshot_graph()
+                # the snapshot plans with a copy of the statistics of its version
+                view._statistics = (
+                    self._current_statistics().copy() if self.use_planner else None
+                )
+                view.journal = None
+                view._snapshot = (self._version, float("inf"), view)
+                self._snapshot = (self._version, time.monotonic(), view)
+            return self._snapshot[2]
+
+    # copy-on-write: the snapshot gets its own dicts of nodes and adjacency, the dicts
+    # of every node (attributes, successors, predecessors) and edge are shared until
+    # a writer changes them, see _own. Multigraphs are copied.
+    def _snapshot_graph(self):
+        graph = self.graph
+        if graph.is_multigraph():
+            self._owned = None
+            return nx.freeze(graph.copy())
+        view = graph.__class__()
+        view.graph.update(graph.graph)
+        view._node = graph._node.copy()
+        view._adj = view._succ = graph._succ.copy()
+        view._pred = graph._pred.copy()
+        self._owned = (set(), set())
+        return nx.freeze(view)
+
+    # copy the dicts of nodes shared with a snapshot before changing them
+    def _own(self, nodes):
+        if self._owned is None:
+            return
+        graph = self.graph
+        owned_nodes = self._owned[0]
+        for node in nodes:
+            if node in graph._node and node not in owned_nodes:
+                graph._node[node] = graph._node[node].copy()
+                graph._succ[node] = graph._succ[node].copy()
+                graph._pred[node] = graph._pred[node].copy()
+                owned_nodes.add(node)
+
+    def _own_edge(self, source, target):
+        if self._owned is None:
+            return
+        self._own((source, target))
+        graph = self.graph
+        owned_edges = self._owned[1]
+        if graph.has_edge(source, target) and (source, target) not in owned_edges:
+            data = graph._succ[source][target].copy()
+            graph._succ[source][target] = data
+            graph._pred[target][source] = data
+            owned_edges.add((source, target))
+
+    # apply several writes at once, readers see either none or all of them
+    @contextlib.contextmanager
+    def batch(self):
+        with self._write_lock:
+            try:
+                yield self
+            finally:
+                self._version += 1
+
+    @_writes
     def delete_sub_graphs(self, sub_graphs):
+        statistics = self._statistics
         for sub_graph in sub_graphs:
             sub_graph_nodes = list(sub_graph.nodes())
+            if self.journal:
+                self.journal.log_delete_nodes(sub_graph_nodes)
+            if statistics:
+                nodes = [node for node in sub_graph_nodes if node in self.graph]
+                # edges between two deleted nodes are counted once
+                statistics.edge_count -= len(
+                    set(self.graph.in_edges(nodes)) | set(self.graph.out_edges(nodes))
+                )
+                for node in nodes:
+                    statistics.remove_node(node, self.graph.nodes[node])
+            if self._owned is not None:
+                self._own(
+                    {
+                        neighbour
+                        for node in sub_graph_nodes
+                        if node in self.graph
+                        for neighbour in itertools.chain(
+                            self.graph.successors(node), self.graph.predecessors(node)
+                        )
+                    }
+                )
             self.graph.remove_nodes_from(sub_graph_nodes)
 
     @staticmethod
@@ -126,22 +388,62 @@ class DSL:
         # Return None if no matching node is found
         return None
 
+    @_writes
     def create_linked_node(self, parent_attributes, node_attributes, link_type=""):
         parent_uuid = None
         if parent_attributes is not None:
             parent_uuid = self.get_uuid(node_attributes=parent_attributes)
 
-        uuid = (
-            str(ObjectId())
-            if "uuid" not in node_attributes
-            else node_attributes["uuid"]
-        )
+        if "uuid" in node_attributes:
+            uuid = node_attributes["uuid"]
+        else:
+            from bson import ObjectId
+
+            uuid = str(ObjectId())
         node_attributes["uuid"] = uuid
+        if self.journal:
+            self.journal.log_create_linked_node(parent_uuid, node_attributes, link_type)
+        statistics = self._statistics
+        if statistics and uuid in self.graph:
+            statistics.remove_node(uuid, dict(self.graph.nodes[uuid]))
+        self._own([uuid])
         self.graph.add_node(uuid, **node_attributes)
+        if statistics:
+            statistics.add_node(uuid, self.graph.nodes[uuid])
         if parent_uuid:
-            self.graph.add_edge(parent_uuid, uuid, link_type=link_type)
+            self._add_edge(statistics, parent_uuid, uuid, link_type)
         return node_attributes
 
+    @_writes
+    def add_link(self, parent_uuid, uuid, link_type=""):
+        if self.journal:
+            self.journal.log_add_edge(parent_uuid, uuid, link_type=link_type)
+        self._add_edge(self._statistics, parent_uuid, uuid, link_type)
+
+    def _add_edge(self, statistics, parent_uuid, uuid, link_type):
+        if statistics and not self.graph.has_edge(parent_uuid, uuid):
+            statistics.edge_count += 1
+        self._own_edge(parent_uuid, uuid)
+        self.graph.add_edge(parent_uuid, uuid, link_type=link_type)
+
+    # attribute value statistics of the graph, built on first use and kept up to date
+    # by the DSL methods. Direct changes of the graph only make the plans worse.
+    def _current_statistics(self):
+        if self._statistics is None:
+            self._statistics = planner.Statistics(self.graph)
+        return self._statistics
+
+    def plan(self, **attributes):
+        pattern_graph = self._create_pattern_graph(**attributes)
+        return planner.QueryPlan(pattern_graph, self._current_statistics())
+
+    # run a query like get_<memory>_<role>s and return its plan with the estimated and
+    # actual number of rows of every step
+    def explain(self, memory=None, **attributes):
+        query_plan = self.plan(**self._query_attributes(memory, attributes))
+        query_plan.execute(self.graph)
+        return query_plan
+
     def get_nodes(self, **attributes):
         sub_graphs = self._find_isomorphic_subgraphs(**attributes)
         return sub_graphs
@@ -172,7 +474,8 @@ class DSL:
 
         return sub_graph_list
 
-    def _find_isomorphic_subgraphs(self, **attributes):
+    # star pattern: one node per given role, linked from the action node if given
+    def _create_pattern_graph(self, **attributes):
         pattern_graph = nx.DiGraph()
 
         for attr_type, attr_values in attributes.items():
@@ -187,31 +490,17 @@ class DSL:
                     pattern_graph.add_edge(
                         "action_node", f"{type_name}_node", link_type="has_part"
                     )
+        return pattern_graph
 
-        def match_func(node1, node2):
-            if ("type" in node1) and ("type" in node2):
-                if node1.get("type") != node2.get("type"):
-                    return False
-            if ("memory" in node1) and ("memory" in node2):
-                if node1.get("memory") != node2.get("memory"):
-                    return False
-            for key in node1:
-                if key != "type" and key in node2:
-                    set1 = (
-                        set(node1[key])
-                        if isinstance(node1[key], list)
-                        else set([node1[key]])
-                    )
-                    set2 = (
-                        set(node2[key])
-                        if isinstance(node2[key], list)
-                        else set([node2[key]])
-                    )
-                    return not set1.isdisjoint(set2)
-            return False
-
+    def _find_isomorphic_subgraphs(self, **attributes):
+        if self.use_planner:
+            return [
+                self.graph.subgraph(mapping.values()).copy()
+                for mapping in self.plan(**attributes).execute(self.graph)
+            ]
+        pattern_graph = self._create_pattern_graph(**attributes)
         matcher = isomorphism.DiGraphMatcher(
-            self.graph, pattern_graph, node_match=match_func
+            self.graph, pattern_graph, node_match=planner.match_attributes
         )
 
         sub_graphs = []
@@ -223,7 +512,9 @@ class DSL:
 
         return sub_graphs
 
-    def _expand_to_full_pattern(self, sub_graphs, hub_type=None):
+    # with unique, matches with the same root nodes are expanded once and identical
+    # node sets are returned only once, otherwise every match is expanded on its own
+    def _expand_to_full_pattern(self, sub_graphs, hub_type=None, unique=True):
         def expand_upwards(node_id, visited=None):
             if visited is None:
                 visited = set()
@@ -248,45 +539,94 @@ class DSL:
                     expand_downwards(successor, hub_type, return_type_found, visited)
             return visited
 
-        expanded_sub_graphs = []
-        for sub_graph in sub_graphs:
-            all_nodes_in_pattern = set()
+        expanded_upwards = {}
+
+        def root_nodes(sub_graph):
+            roots = set()
             for node_data in sub_graph.nodes(data=True):
                 node_id = node_data[0]
                 node_type = node_data[1]["type"]
                 if hub_type == node_type:
-                    action_root_nodes = [node_id]
+                    roots.add(node_id)
                 else:
-                    action_root_nodes = expand_upwards(node_id)
-                for action_root in action_root_nodes:
+                    if node_id not in expanded_upwards:
+                        expanded_upwards[node_id] = expand_upwards(node_id)
+                    roots.update(expanded_upwards[node_id])
+            return roots
+
+        if not unique:
+            expanded_sub_graphs = []
+            for sub_graph in sub_graphs:
+                all_nodes_in_pattern = set()
+                for action_root in root_nodes(sub_graph):
                     nodes_in_pattern = expand_downwards(action_root, hub_type)
                     all_nodes_in_pattern.update(nodes_in_pattern)
 
+                if all_nodes_in_pattern:
+                    expanded_sub_graph = self.graph.subgraph(
+                        all_nodes_in_pattern
+                    ).copy()
+                    expanded_sub_graphs.append(expanded_sub_graph)
+
+            return expanded_sub_graphs
+
+        # canonicalize: group matches by node set and root set, expand every root once
+        # and build one sub graph per distinct node set
+        matches = {}
+        for sub_graph in sub_graphs:
+            matches.setdefault(frozenset(sub_graph.nodes), sub_graph)
+        root_sets = dict.fromkeys(
+            frozenset(root_nodes(sub_graph)) for sub_graph in matches.values()
+        )
+        expanded_roots = {}
+        pattern_node_sets = {}
+        for roots in root_sets:
+            all_nodes_in_pattern = set()
+            for action_root in roots:
+                if action_root not in expanded_roots:
+                    expanded_roots[action_root] = expand_downwards(
+                        action_root, hub_type
+                    )
+                all_nodes_in_pattern.update(expanded_roots[action_root])
             if all_nodes_in_pattern:
-                expanded_sub_graph = self.graph.subgraph(all_nodes_in_pattern).copy()
-                expanded_sub_graphs.append(expanded_sub_graph)
+                pattern_node_sets[frozenset(all_nodes_in_pattern)] = None
 
-        return expanded_sub_graphs
+        return [self.graph.subgraph(nodes).copy() for nodes in pattern_node_sets]
 
-    def _generic_get_memory_method(self, return_type, memory_type, **kwargs):
+    def _generic_get_memory_method(
+        self, return_type, memory_type, unique=True, **kwargs
+    ):
         return self._find_sub_graphs(
-            return_type=return_type, memory=memory_type, **kwargs
+            return_type=return_type, memory=memory_type, unique=unique, **kwargs
         )
 
-    def _add_dynamic_methods(self):
-        for memory_type in self.memory_types:
-            for role_type in self.role_types:
+    # create interface function for all combinations of role and memory types with
+    # pattern get_<memory_type>_<role_type>, once when the module is imported
+    @classmethod
+    def _add_dynamic_methods(cls):
+        for memory_type in cls.memory_types:
+            for role_type in cls.role_types:
                 method_name = (
                     f"get_{role_type}s"
                     if memory_type is None
                     else f"get_{memory_type}_{role_type}s"
                 )
                 setattr(
-                    self.__class__,
+                    cls,
                     method_name,
-                    (
-                        lambda self, vt=role_type, mt=memory_type, **kwargs: self._generic_get_memory_method(
-                            return_type=vt, memory_type=mt, **kwargs
-                        )
-                    ),
+                    cls._create_get_method(method_name, role_type, memory_type),
                 )
+
+    @staticmethod
+    def _create_get_method(method_name, role_type, memory_type):
+        def get_method(self, **kwargs):
+            return self._generic_get_memory_method(
+                return_type=role_type, memory_type=memory_type, **kwargs
+            )
+
+        get_method.__name__ = method_name
+        get_method.__qualname__ = f"DSL.{method_name}"
+        return get_method
+
+
+DSL._add_dynamic_methods()
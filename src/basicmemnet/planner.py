@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import math
+
+
+# node_match of the pattern queries: type and memory have to be equal if both nodes
+# have them, the first other attribute both nodes have has to share a value
+def match_attributes(node1, node2):
+    if ("type" in node1) and ("type" in node2):
+        if node1.get("type") != node2.get("type"):
+            return False
+    if ("memory" in node1) and ("memory" in node2):
+        if node1.get("memory") != node2.get("memory"):
+            return False
+    for key in node1:
+        if key != "type" and key in node2:
+            return not set(_values(node1[key])).isdisjoint(_values(node2[key]))
+    return False
+
+
+def _values(value):
+    return value if isinstance(value, list) else [value]
+
+
+class Statistics:
+    # value cardinalities of all node attributes, list attributes count once per
+    # element. They only order the plan, so they may lag behind direct changes of
+    # the graph without changing query results.
+    def __init__(self, graph=None):
+        self.node_count = 0
+        self.edge_count = 0
+        self.counts = {}
+        if graph is not None:
+            self.edge_count = graph.number_of_edges()
+            for node, attributes in graph.nodes(data=True):
+                self.add_node(node, attributes)
+
+    def copy(self):
+        statistics = Statistics()
+        statistics.node_count = self.node_count
+        statistics.edge_count = self.edge_count
+        statistics.counts = self.counts.copy()
+        return statistics
+
+    def add_node(self, node, attributes):
+        self._count(attributes, 1)
+
+    def remove_node(self, node, attributes):
+        self._count(attributes, -1)
+
+    def _count(self, attributes, step):
+        if not attributes:
+            return
+        self.node_count += step
+        for key, value in attributes.items():
+            for element in _values(value):
+                try:
+                    count = self.counts.get((key, element), 0) + step
+                    if count > 0:
+                        self.counts[key, element] = count
+                    else:
+                        self.counts.pop((key, element), None)
+                except TypeError:
+                    pass
+
+    def count(self, key, value):
+        try:
+            return sum(self.counts.get((key, v), 0) for v in _values(value))
+        except TypeError:
+            return self.node_count
+
+    # fraction of nodes matching the pattern node. Attributes are often correlated
+    # (utterances imply the type), so the less selective ones are damped by
+    # exponential backoff instead of multiplying all of them.
+    def selectivity(self, attributes):
+        if not attributes or not self.node_count:
+            return 0.0
+        selectivities = sorted(
+            min(1.0, self.count(key, value) / self.node_count)
+            for key, value in attributes.items()
+        )
+        selectivity = 1.0
+        for exponent, value in enumerate(selectivities):
+            selectivity *= value ** (0.5**exponent)
+        return selectivity
+
+    def estimate(self, attributes):
+        return self.node_count * self.selectivity(attributes)
+
+    def fan_out(self):
+        return self.edge_count / self.node_count if self.node_count else 0.0
+
+
+class PlanStep:
+    # one pattern node of a plan, either found by a scan of all nodes or reached
+    # along a pattern edge from a node matched before. Other backends describe
+    # their access path with a text.
+    def __init__(
+        self, pattern_node, source=None, direction=None, estimated=0.0, access=None
+    ):
+        self.pattern_node = pattern_node
+        self.source = source
+        self.direction = direction
+        self.estimated = estimated
+        self.actual = 0
+        self._access = access
+
+    def access(self):
+        if self._access is not None:
+            return self._access
+        if self.source is None:
+            return "scan of all nodes"
+        return f"{self.direction} of {self.source}"
+
+
+def format_steps(steps):
+    rows = [("step", "pattern node", "access", "estimated", "actual")]
+    for number, step in enumerate(steps):
+        if step.estimated is None:
+            estimated = "-"
+        else:
+            estimated = str(math.ceil(step.estimated) if step.estimated else 0)
+        actual = "-" if step.actual is None else str(step.actual)
+        rows.append((str(number), step.pattern_node, step.access(), estimated, actual))
+    widths = [max(len(row[column]) for row in rows) for column in range(5)]
+    return "\n".join(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+class Explanation:
+    # plan of a query on the sqlite or shared memory backend and its number of
+    # matches, steps without estimated or actual rows show "-"
+    def __init__(self, steps, rows):
+        self.steps = steps
+        self.rows = rows
+
+    def __str__(self):
+        return format_steps(self.steps) + f"\nrows: {self.rows}"
+
+
+class QueryPlan:
+    # cost-based order of the pattern nodes. The most selective node is the anchor,
+    # then the plan greedily follows pattern edges to the node with the fewest
+    # estimated rows, nodes without a path to the matched ones are joined last.
+    # Anchors are found by a scan of all nodes (O(N) per query, like the first
+    # step of the networkx matcher), the plan saves the exploration after it.
+    def __init__(self, pattern_graph, statistics):
+        self.pattern_graph = pattern_graph
+        self.statistics = statistics
+        self.steps = []
+        estimates = {
+            node: statistics.estimate(attributes)
+            for node, attributes in pattern_graph.nodes(data=True)
+        }
+        fan_out = statistics.fan_out()
+        planned = set()
+        rows = 1.0
+        while len(planned) < len(pattern_graph):
+            reachable = {}
+            for node in planned:
+                for successor in pattern_graph.successors(node):
+                    reachable.setdefault(successor, (node, "successors"))
+                for predecessor in pattern_graph.predecessors(node):
+                    reachable.setdefault(predecessor, (node, "predecessors"))
+            options = [node for node in reachable if node not in planned]
+            if options:
+                node = min(options, key=estimates.get)
+                source, direction = reachable[node]
+                attributes = pattern_graph.nodes[node]
+                rows *= fan_out * statistics.selectivity(attributes)
+            else:
+                node = min(
+                    (node for node in pattern_graph if node not in planned),
+                    key=estimates.get,
+                )
+                source, direction = None, None
+                rows *= estimates[node]
+            self.steps.append(PlanStep(node, source, direction, rows))
+            planned.add(node)
+
+    # all mappings of pattern nodes to graph nodes, the matched nodes induce the same
+    # edges as the pattern (like the subgraph isomorphisms of networkx)
+    def execute(self, graph):
+        for step in self.steps:
+            step.actual = 0
+        if not self.steps:
+            return []
+        pattern = self.pattern_graph
+        # candidates of unconnected pattern nodes come from a scan of the current
+        # graph, the statistics may be outdated after direct changes of the graph
+        scan_candidates = {
+            step.pattern_node: [
+                node
+                for node, attributes in graph.nodes(data=True)
+                if match_attributes(attributes, pattern.nodes[step.pattern_node])
+            ]
+            for step in self.steps
+            if step.source is None
+        }
+        matches = []
+        mapping = {}
+        used = set()
+
+        def consistent(pattern_node, node):
+            if graph.has_edge(node, node) != pattern.has_edge(
+                pattern_node, pattern_node
+            ):
+                return False
+            for other, other_node in mapping.items():
+                if graph.has_edge(node, other_node) != pattern.has_edge(
+                    pattern_node, other
+                ) or graph.has_edge(other_node, node) != pattern.has_edge(
+                    other, pattern_node
+                ):
+                    return False
+            return True
+
+        def extend(depth):
+            if depth == len(self.steps):
+                matches.append(dict(mapping))
+                return
+            step = self.steps[depth]
+            attributes = pattern.nodes[step.pattern_node]
+            if step.source is None:
+                candidates = scan_candidates[step.pattern_node]
+            else:
+                source = mapping[step.source]
+                neighbours = (
+                    graph.successors(source)
+                    if step.direction == "successors"
+                    else graph.predecessors(source)
+                )
+                candidates = [
+                    node
+                    for node in neighbours
+                    if match_attributes(graph.nodes[node], attributes)
+                ]
+            for node in candidates:
+                if node in used or not consistent(step.pattern_node, node):
+                    continue
+                step.actual += 1
+                mapping[step.pattern_node] = node
+                used.add(node)
+                extend(depth + 1)
+                used.discard(node)
+                del mapping[step.pattern_node]
+
+        extend(0)
+        return matches
+
+    def __str__(self):
+        return format_steps(self.steps)
@@ -35,18 +35,230 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import matplotlib.colors as pltcolors
 import math
+from collections import deque
 
 
+class AggregatedView:
+    # level-of-detail view of a large memory graph: only the top levels around a
+    # focus node (or around the root nodes) stay visible, has_next chains are
+    # collapsed into segments and hidden successors into counted super-nodes
+    def __init__(self, graph, focus=None, depth=2, max_children=8, min_chain=3):
+        self.graph = graph
+        # a focus which is not in the graph (e.g. when plotting several graphs with
+        # the same focus) falls back to the root nodes
+        self.focus = focus if focus in graph else None
+        self.depth = depth
+        self.max_children = max_children
+        self.min_chain = min_chain
+        # nodes whose neighbourhood was expanded, nodes made visible by expanding a
+        # super-node and nodes that are not collapsed into segments anymore
+        self.expanded = set()
+        self.revealed = set()
+        self.unchained = set()
+        self.members = {}
+        self._subtree_sizes = {}
+
+    def expand(self, node):
+        if node in self.members:
+            kind, members = self.members[node]
+            if kind == "segment":
+                self.unchained.update(members)
+            else:
+                # reveal hidden nodes page-wise to keep the view bounded
+                self.revealed.update(members[: self.max_children])
+        elif node in self.graph:
+            self.expanded.add(node)
+
+    def build(self):
+        self.members = {}
+        visible, hidden_roots = self._visible_nodes()
+        representative = self._collapse_chains(visible)
+
+        view = nx.DiGraph()
+        for node in visible:
+            rep = representative[node]
+            if rep == node:
+                view.add_node(node, **self.graph.nodes[node])
+        for rep, (kind, members) in self.members.items():
+            view.add_node(rep, **self._super_node_attributes(kind, members))
+
+        hidden = {}
+        for node in visible:
+            rep = representative[node]
+            for successor in self.graph.successors(node):
+                link_type = self.graph.edges[node, successor].get("link_type")
+                if successor in visible:
+                    successor_rep = representative[successor]
+                    if successor_rep != rep:
+                        view.add_edge(rep, successor_rep, link_type=link_type)
+                else:
+                    hidden.setdefault((rep, link_type), []).append(successor)
+
+        for (rep, link_type), members in hidden.items():
+            super_node = f"{rep}/{link_type}/hidden"
+            self.members[super_node] = ("hidden", members)
+            view.add_node(super_node, **self._super_node_attributes("hidden", members))
+            view.add_edge(rep, super_node, link_type=link_type)
+        if hidden_roots:
+            self.members["roots/hidden"] = ("hidden", hidden_roots)
+            view.add_node(
+                "roots/hidden", **self._super_node_attributes("hidden", hidden_roots)
+            )
+        return view
+
+    def _neighbours(self, node):
+        if self.focus is None:
+            return list(self.graph.successors(node))
+        return list(self.graph.predecessors(node)) + list(self.graph.successors(node))
+
+    def _visible_nodes(self):
+        hidden_roots = []
+        if self.focus is not None:
+            seeds = [self.focus]
+        else:
+            roots = [node for node in self.graph if self.graph.in_degree(node) == 0]
+            seeds = roots[: self.max_children]
+            hidden_roots = roots[self.max_children :]
+
+        queue = deque((node, self.depth) for node in seeds)
+        queue.extend((node, 1) for node in self.expanded if node in self.graph)
+        queue.extend((node, 0) for node in self.revealed if node in self.graph)
+        visible = {}
+        while queue:
+            node, remaining = queue.popleft()
+            if visible.get(node, -1) >= remaining:
+                continue
+            visible[node] = remaining
+            if remaining == 0:
+                continue
+            added = 0
+            for neighbour in self._neighbours(node):
+                if neighbour in visible:
+                    continue
+                if added >= self.max_children and neighbour not in self.expanded:
+                    continue
+                queue.append((neighbour, remaining - 1))
+                added += 1
+
+        hidden_roots = [node for node in hidden_roots if node not in visible]
+        return visible, hidden_roots
+
+    def _collapse_chains(self, visible):
+        representative = {node: node for node in visible}
+
+        def chainable(node):
+            return node in visible and node != self.focus and node not in self.unchained
+
+        next_node = {}
+        predecessor_count = {}
+        for node in visible:
+            if not chainable(node):
+                continue
+            successors = [
+                successor
+                for successor in self.graph.successors(node)
+                if self.graph.edges[node, successor].get("link_type") == "has_next"
+            ]
+            if len(successors) == 1 and chainable(successors[0]):
+                next_node[node] = successors[0]
+                predecessor_count[successors[0]] = (
+                    predecessor_count.get(successors[0], 0) + 1
+                )
+
+        for head in next_node:
+            if predecessor_count.get(head, 0) == 1:
+                continue
+            chain = [head]
+            node = head
+            while node in next_node and predecessor_count[next_node[node]] == 1:
+                node = next_node[node]
+                chain.append(node)
+            if len(chain) >= self.min_chain:
+                segment = f"{chain[0]}..{chain[-1]}"
+                self.members[segment] = ("segment", chain)
+                for node in chain:
+                    representative[node] = segment
+
+        return representative
+
+    def _subtree_size(self, node):
+        # number of nodes below (and including) node along spec_to links
+        if node in self._subtree_sizes:
+            return self._subtree_sizes[node]
+        # nodes whose children are being counted, a spec_to cycle back to one of
+        # them adds nothing
+        in_progress = set()
+        stack = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if current in self._subtree_sizes:
+                continue
+            if not children_done and current in in_progress:
+                continue
+            children = [
+                successor
+                for successor in self.graph.successors(current)
+                if self.graph.edges[current, successor].get("link_type") == "spec_to"
+            ]
+            if children_done:
+                in_progress.discard(current)
+                self._subtree_sizes[current] = 1 + sum(
+                    self._subtree_sizes.get(child, 0) for child in children
+                )
+            else:
+                in_progress.add(current)
+                stack.append((current, True))
+                stack.extend(
+                    (child, False)
+                    for child in children
+                    if child not in self._subtree_sizes and child not in in_progress
+                )
+        return self._subtree_sizes[node]
+
+    def _super_node_attributes(self, kind, members):
+        first = self.graph.nodes[members[0]]
+        types = {self.graph.nodes[member].get("type") for member in members}
+        if kind == "segment":
+            size = len(members)
+            label = f"{self._label(members[0])} .. {self._label(members[-1])}"
+        else:
+            size = sum(self._subtree_size(member) for member in members)
+            label = f"+{len(members)}"
+        attributes = {
+            "utterances": [f"{label} ({size})"],
+            "aggregate": kind,
+            "size": size,
+        }
+        if len(types) == 1 and None not in types:
+            attributes["type"] = types.pop()
+        if "memory" in first:
+            attributes["memory"] = first["memory"]
+        return attributes
+
+    def _label(self, node):
+        attr = self.graph.nodes[node]
+        utterances = attr.get("utterances", node)
+        return utterances if isinstance(utterances, str) else utterances[0]
+
+
+# matplotlib is imported when plotting, so that the aggregated view and the rest of
+# the package can be used without it
 class PlotGraph:
     def __init__(self):
         self.figsize = (15, 10)
         self.edge_colors = {"ltm": None, "mtm": "darkgray", "stm": "red"}
+        self.type_color = {
+            "action": "red",
+            "object": "blue",
+            "tool": "green",
+            "state": "gray",
+            "lemma": "yellow",
+        }
+
+    def plot(self, graphs, title=None, aggregate=False, focus=None, depth=2):
+        import matplotlib.pyplot as plt
 
-    def plot(self, graphs, title=None):
         n = len(graphs)
         cols = int(math.ceil(math.sqrt(n)))
         rows = 1 if cols == 0 else int(math.ceil(n / cols))
@@ -63,100 +275,165 @@ class PlotGraph:
 
         for i, graph in enumerate(graphs, 1):
             ax = plt.subplot(rows, cols, i)
+            if aggregate:
+                graph = AggregatedView(graph, focus=focus, depth=depth).build()
+            self._draw_graph(ax, graph, self._layout(graph))
 
-            type_color = {
-                "action": "red",
-                "object": "blue",
-                "tool": "green",
-                "state": "gray",
-                "lemma": "yellow",
-            }
-
-            edge_colors = []
-            for node in graph.nodes:
-                attr = graph.nodes[node]
-                edge_color = None
-                if ("memory" in attr) and (attr["memory"] in self.edge_colors.keys()):
-                    if self.edge_colors[attr["memory"]] is None:
-                        r, g, b, _ = pltcolors.to_rgba(type_color[attr["type"]])
-                        edge_color = (r, g, b, 0.2)
-                    else:
-                        r, g, b, _ = pltcolors.to_rgba(self.edge_colors[attr["memory"]])
-                        edge_color = (r, g, b, 1.0)
-                else:
-                    edge_color = (0.0, 0.0, 0.0, 1.0)
-                edge_colors.append(edge_color)
-
-            colors = []
-            for node in graph.nodes:
-                attr = graph.nodes[node]
-                if ("type" in attr) and (attr["type"] in type_color.keys()):
-                    node_type = attr["type"]
-                    r, g, b, _ = pltcolors.to_rgba(type_color[node_type])
-                else:
-                    r = g = b = 0.0
-                colors.append((r, g, b, 0.2))
-
-                try:
-                    # Attempt to use pydot_layout
-                    pos = nx.nx_pydot.pydot_layout(graph, prog="dot")
-                except:
-                    # Fallback to spring_layout if pydot_layout is not available
-                    print("pydot_layout failed, using spring_layout instead.")
-                    pos = nx.spring_layout(graph)
-
-            labels = dict()
-            for n in graph.nodes:
-                label = ""
-                if "utterances" in graph.nodes[n]:
-                    utterances = graph.nodes[n].get("utterances")
-                    uuid = graph.nodes[n].get("uuid")
-                    accessid = graph.nodes[n].get("accessid")
-                    utterance_text = (
-                        utterances if isinstance(utterances, str) else utterances[0]
-                    )
-                    # label = accessid if accessid else f"{utterance_text}\n{uuid[-4:]}"
-                    label = accessid if accessid else utterance_text
-                labels.update({n: label})
-
-            nx.draw_networkx_nodes(
-                graph,
-                pos,
-                node_color=colors,
-                edgecolors=edge_colors,  # Border color
-                linewidths=2,  # Width of the border, adjust as needed
-            )
+        plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+        plt.show()
 
-            nx.draw_networkx_edges(
-                graph,
-                pos,
-                arrows=True,
-                edge_color="black",  # Replace 'edge_colors' with your edge color array
-                arrowstyle="->",
-            )
+    # interactive level-of-detail plot, clicking a node expands it
+    def plot_aggregated(self, graph, focus=None, depth=2, title=None):
+        import matplotlib.pyplot as plt
 
-            nx.draw_networkx_labels(
-                graph,
-                pos,
-                labels=labels,
-                font_size=10,
-            )
+        view = AggregatedView(graph, focus=focus, depth=depth)
+        fig = plt.figure(figsize=self.figsize)
+        ax = plt.subplot(1, 1, 1)
+        positions = {}
 
-            edge_labels = nx.get_edge_attributes(graph, "link_type")
-            nx.draw_networkx_edge_labels(
-                graph, pos, edge_labels=edge_labels, font_color="black", font_size=8
-            )
+        def draw():
+            ax.clear()
+            view_graph = view.build()
+            positions.clear()
+            positions.update(self._layout(view_graph))
+            self._draw_graph(ax, view_graph, positions)
+            fig.canvas.draw_idle()
 
-            rect = patches.Rectangle(
-                (0, 0),
-                1,
-                1,
-                linewidth=2,
-                edgecolor="black",
-                facecolor="none",
-                transform=ax.transAxes,
-            )
-            ax.add_patch(rect)
+        def on_key_press(event):
+            plt.close(fig)
 
+        def on_click(event):
+            if event.inaxes is not ax or not positions:
+                return
+            nodes = list(positions)
+            points = ax.transData.transform([positions[node] for node in nodes])
+            distances = [math.hypot(x - event.x, y - event.y) for x, y in points]
+            nearest = min(range(len(nodes)), key=distances.__getitem__)
+            if distances[nearest] < 20:
+                view.expand(nodes[nearest])
+                draw()
+
+        fig.canvas.mpl_connect("key_press_event", on_key_press)
+        fig.canvas.mpl_connect("button_press_event", on_click)
+
+        if title:
+            fig.suptitle(title, fontsize=16)
+
+        draw()
         plt.tight_layout(rect=[0, 0.03, 1, 0.95])
         plt.show()
+
+    @staticmethod
+    def _layout(graph):
+        try:
+            # Attempt to use pydot_layout
+            return nx.nx_pydot.pydot_layout(graph, prog="dot")
+        except:
+            # Fallback to spring_layout if pydot_layout is not available
+            print("pydot_layout failed, using spring_layout instead.")
+            return nx.spring_layout(graph)
+
+    def _draw_graph(self, ax, graph, pos):
+        import matplotlib.patches as patches
+        import matplotlib.colors as pltcolors
+
+        type_color = self.type_color
+
+        edge_colors = []
+        for node in graph.nodes:
+            attr = graph.nodes[node]
+            edge_color = None
+            if ("memory" in attr) and (attr["memory"] in self.edge_colors.keys()):
+                if self.edge_colors[attr["memory"]] is None:
+                    r, g, b, _ = pltcolors.to_rgba(
+                        type_color.get(attr.get("type"), "black")
+                    )
+                    edge_color = (r, g, b, 0.2)
+                else:
+                    r, g, b, _ = pltcolors.to_rgba(self.edge_colors[attr["memory"]])
+                    edge_color = (r, g, b, 1.0)
+            else:
+                edge_color = (0.0, 0.0, 0.0, 1.0)
+            edge_colors.append(edge_color)
+
+        colors = []
+        for node in graph.nodes:
+            attr = graph.nodes[node]
+            if ("type" in attr) and (attr["type"] in type_color.keys()):
+                node_type = attr["type"]
+                r, g, b, _ = pltcolors.to_rgba(type_color[node_type])
+            else:
+                r = g = b = 0.0
+            colors.append((r, g, b, 0.2))
+
+        # super-nodes of an aggregated view grow with the number of collapsed nodes
+        node_sizes = [
+            (
+                300 * (1 + math.log10(max(graph.nodes[node]["size"], 1)))
+                if "aggregate" in graph.nodes[node]
+                else 300
+            )
+            for node in graph.nodes
+        ]
+
+        labels = dict()
+        for n in graph.nodes:
+            label = ""
+            if "utterances" in graph.nodes[n]:
+                utterances = graph.nodes[n].get("utterances")
+                uuid = graph.nodes[n].get("uuid")
+                accessid = graph.nodes[n].get("accessid")
+                utterance_text = (
+                    utterances if isinstance(utterances, str) else utterances[0]
+                )
+                # label = accessid if accessid else f"{utterance_text}\n{uuid[-4:]}"
+                label = accessid if accessid else utterance_text
+            labels.update({n: label})
+
+        nx.draw_networkx_nodes(
+            graph,
+            pos,
+            ax=ax,
+            node_color=colors,
+            node_size=node_sizes,
+            edgecolors=edge_colors,  # Border color
+            linewidths=2,  # Width of the border, adjust as needed
+        )
+
+        nx.draw_networkx_edges(
+            graph,
+            pos,
+            ax=ax,
+            arrows=True,
+            edge_color="black",  # Replace 'edge_colors' with your edge color array
+            arrowstyle="->",
+        )
+
+        nx.draw_networkx_labels(
+            graph,
+            pos,
+            ax=ax,
+            labels=labels,
+            font_size=10,
+        )
+
+        edge_labels = nx.get_edge_attributes(graph, "link_type")
+        nx.draw_networkx_edge_labels(
+            graph,
+            pos,
+            ax=ax,
+            edge_labels=edge_labels,
+            font_color="black",
+            font_size=8,
+        )
+
+        rect = patches.Rectangle(
+            (0, 0),
+            1,
+            1,
+            linewidth=2,
+            edgecolor="black",
+            facecolor="none",
+            transform=ax.transAxes,
+        )
+        ax.add_patch(rect)
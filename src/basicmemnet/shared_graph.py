@@ -0,0 +1,574 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import networkx as nx
+from basicmemnet import memnet
+from basicmemnet import planner
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+import itertools
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b"MNSHG001"
+
+# sections of the encoded graph, in this order. Arrays are int64 ("q") unless
+# given otherwise, "B" are raw bytes. Nodes are numbered in graph order.
+SECTIONS = [
+    ("node_ids", "B"),  # json encoded node ids, concatenated
+    ("node_id_offsets", "q"),
+    ("node_id_order", "q"),  # node numbers sorted by encoded id, for lookups
+    ("out_offsets", "q"),  # csr adjacency of successors
+    ("out_targets", "q"),
+    ("out_attributes", "q"),  # edge attribute code per successor
+    ("in_offsets", "q"),  # csr adjacency of predecessors
+    ("in_sources", "q"),
+    ("node_term_offsets", "q"),  # attribute terms per node
+    ("node_terms", "q"),
+    ("node_term_flags", "B"),  # TERM_SCALAR, TERM_LIST or TERM_EMPTY_LIST
+    ("terms", "B"),  # sorted, json encoded [key, value] terms
+    ("term_offsets", "q"),
+    ("posting_offsets", "q"),  # nodes per term
+    ("postings", "q"),
+    ("edge_attributes", "B"),  # json encoded, distinct edge attribute dicts
+    ("edge_attribute_offsets", "q"),
+]
+HEADER = struct.Struct(f"<8s{2 * len(SECTIONS)}q")
+
+TERM_SCALAR = 0
+TERM_LIST = 1
+TERM_EMPTY_LIST = 2
+
+
+# the block is owned by the publisher, who removes it with unlink(). Keep the resource
+# tracker of the current process from removing it when the process exits.
+def _untrack(block):
+    if os.name == "posix":
+        resource_tracker.unregister(block._name, "shared_memory")
+
+
+def _term(key, value):
+    return json.dumps([key, value]).encode()
+
+
+def _strings(strings):
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return b"".join(strings), offsets
+
+
+def encode(graph):
+    nodes = list(graph)
+    index = {node: i for i, node in enumerate(nodes)}
+    node_ids = [json.dumps(node).encode() for node in nodes]
+    node_id_order = sorted(range(len(nodes)), key=node_ids.__getitem__)
+
+    edge_attribute_codes = {}
+    out_offsets, out_targets, out_attributes = [0], [], []
+    in_offsets, in_sources = [0], []
+    for node in nodes:
+        for successor, attributes in graph.adj[node].items():
+            blob = json.dumps(attributes, sort_keys=True).encode()
+            out_targets.append(index[successor])
+            out_attributes.append(
+                edge_attribute_codes.setdefault(blob, len(edge_attribute_codes))
+            )
+        out_offsets.append(len(out_targets))
+        in_sources.extend(index[predecessor] for predecessor in graph.pred[node])
+        in_offsets.append(len(in_sources))
+
+    node_terms = []
+    for node in nodes:
+        terms = []
+        for key, value in graph.nodes[node].items():
+            if isinstance(value, (list, tuple)):
+                if not value:
+                    terms.append((_term(key, None), TERM_EMPTY_LIST))
+                terms.extend((_term(key, v), TERM_LIST) for v in value)
+            else:
+                terms.append((_term(key, value), TERM_SCALAR))
+        node_terms.append(terms)
+
+    sorted_terms = sorted({term for terms in node_terms for term, _ in terms})
+    term_codes = {term: code for code, term in enumerate(sorted_terms)}
+    postings = [[] for _ in sorted_terms]
+    node_term_offsets, node_term_codes, node_term_flags = [0], [], []
+    for i, terms in enumerate(node_terms):
+        for term, flag in terms:
+            code = term_codes[term]
+            node_term_codes.append(code)
+            node_term_flags.append(flag)
+            if flag != TERM_EMPTY_LIST and (
+                not postings[code] or postings[code][-1] != i
+            ):
+                postings[code].append(i)
+        node_term_offsets.append(len(node_term_codes))
+    posting_offsets = [0]
+    for posting in postings:
+        posting_offsets.append(posting_offsets[-1] + len(posting))
+
+    node_id_data, node_id_offsets = _strings(node_ids)
+    term_data, term_offsets = _strings(sorted_terms)
+    edge_attribute_data, edge_attribute_offsets = _strings(list(edge_attribute_codes))
+    return {
+        "node_ids": node_id_data,
+        "node_id_offsets": node_id_offsets,
+        "node_id_order": node_id_order,
+        "out_offsets": out_offsets,
+        "out_targets": out_targets,
+        "out_attributes": out_attributes,
+        "in_offsets": in_offsets,
+        "in_sources": in_sources,
+        "node_term_offsets": node_term_offsets,
+        "node_terms": node_term_codes,
+        "node_term_flags": bytes(node_term_flags),
+        "terms": term_data,
+        "term_offsets": term_offsets,
+        "posting_offsets": posting_offsets,
+        "postings": list(itertools.chain.from_iterable(postings)),
+        "edge_attributes": edge_attribute_data,
+        "edge_attribute_offsets": edge_attribute_offsets,
+    }
+
+
+# encoded sections as bytes, each section 8 byte aligned
+def to_bytes(sections):
+    header = [MAGIC]
+    chunks = []
+    offset = HEADER.size
+    for name, typecode in SECTIONS:
+        data = sections[name]
+        if typecode != "B":
+            data = struct.pack(f"<{len(data)}{typecode}", *data)
+        header.extend([offset, len(data)])
+        chunks.append(data + b"\0" * (-len(data) % 8))
+        offset += len(chunks[-1])
+    return HEADER.pack(*header) + b"".join(chunks)
+
+
+class _NodeView:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node):
+        return self._graph._attributes(self._graph._index(node))
+
+    def __contains__(self, node):
+        return node in self._graph
+
+    def __iter__(self):
+        return iter(self._graph)
+
+    def __len__(self):
+        return len(self._graph)
+
+    def __call__(self, data=False):
+        if not data:
+            return iter(self._graph)
+        return (
+            (self._graph._node_id(i), self._graph._attributes(i))
+            for i in range(len(self._graph))
+        )
+
+
+class _EdgeView:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        source, target = edge
+        return self._graph._successors(self._graph._index(source))[
+            self._graph._index(target)
+        ]
+
+
+class SharedGraph:
+    # read-only graph on an array encoded buffer (shared memory or memory-mapped
+    # file), providing the part of the networkx.DiGraph interface the DSL uses.
+    # All arrays are zero-copy views, only decoded node attributes are cached.
+    def __init__(self, buffer, owner=None, cache_size=10000):
+        self._buffer = memoryview(buffer)
+        self._owner = owner
+        header = HEADER.unpack_from(self._buffer)
+        if header[0] != MAGIC:
+            raise ValueError("Buffer does not contain a shared memnet graph")
+        for i, (name, typecode) in enumerate(SECTIONS):
+            offset, size = header[1 + 2 * i], header[2 + 2 * i]
+            section = self._buffer[offset : offset + size]
+            setattr(
+                self, "_" + name, section.cast(typecode) if typecode != "B" else section
+            )
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._edge_attribute_cache = {}
+        self.nodes = _NodeView(self)
+        self.edges = _EdgeView(self)
+
+    # publish a graph into a new shared memory block, the publisher has to unlink() it
+    @classmethod
+    def publish(cls, graph, name=None, cache_size=10000):
+        data = to_bytes(encode(graph))
+        block = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        block.buf[: len(data)] = data
+        _untrack(block)
+        return cls(block.buf[: len(data)], owner=block, cache_size=cache_size)
+
+    @classmethod
+    def attach(cls, name, cache_size=10000):
+        block = shared_memory.SharedMemory(name=name)
+        _untrack(block)
+        return cls(block.buf, owner=block, cache_size=cache_size)
+
+    @staticmethod
+    def save(graph, file_path):
+        with open(file_path, "wb") as file:
+            file.write(to_bytes(encode(graph)))
+
+    @classmethod
+    def load(cls, file_path, cache_size=10000):
+        with open(file_path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapping, owner=mapping, cache_size=cache_size)
+
+    @property
+    def name(self):
+        return getattr(self._owner, "name", None)
+
+    def close(self):
+        self._cache.clear()
+        for name, _ in SECTIONS:
+            getattr(self, "_" + name).release()
+        self._buffer.release()
+        self._owner.close()
+
+    def unlink(self):
+        if os.name == "posix":
+            # unlink() unregisters the block from the resource tracker again
+            resource_tracker.register(self._owner._name, "shared_memory")
+        self._owner.unlink()
+
+    def __len__(self):
+        return len(self._node_id_order)
+
+    def __iter__(self):
+        return (self._node_id(i) for i in range(len(self)))
+
+    def __contains__(self, node):
+        return self._find(node) is not None
+
+    def has_node(self, node):
+        return node in self
+
+    def number_of_edges(self):
+        return len(self._out_targets)
+
+    @staticmethod
+    def _string(data, offsets, i):
+        return bytes(data[offsets[i] : offsets[i + 1]])
+
+    def _node_id(self, i):
+        return json.loads(self._string(self._node_ids, self._node_id_offsets, i))
+
+    # binary search of a node id in the sorted id order
+    def _find(self, node):
+        try:
+            key = json.dumps(node).encode()
+        except TypeError:
+            return None
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            i = self._node_id_order[middle]
+            current = self._string(self._node_ids, self._node_id_offsets, i)
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return i
+        return None
+
+    def _index(self, node):
+        i = self._find(node)
+        if i is None:
+            raise KeyError(node)
+        return i
+
+    def _term_bound(self, key):
+        low, high = 0, len(self._term_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._string(self._terms, self._term_offsets, middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _term_code(self, term):
+        code = self._term_bound(term)
+        if (
+            code < len(self._term_offsets) - 1
+            and self._string(self._terms, self._term_offsets, code) == term
+        ):
+            return code
+        return None
+
+    def _posting(self, code):
+        return self._postings[
+            self._posting_offsets[code] : self._posting_offsets[code + 1]
+        ]
+
+    def _attributes(self, i):
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        attributes = {}
+        start, end = self._node_term_offsets[i], self._node_term_offsets[i + 1]
+        for code, flag in zip(
+            self._node_terms[start:end], self._node_term_flags[start:end]
+        ):
+            key, value = json.loads(self._string(self._terms, self._term_offsets, code))
+            if flag == TERM_SCALAR:
+                attributes[key] = value
+            elif flag == TERM_EMPTY_LIST:
+                attributes[key] = []
+            else:
+                attributes.setdefault(key, []).append(value)
+        self._cache[i] = attributes
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return attributes
+
+    def _edge_attribute(self, code):
+        if code not in self._edge_attribute_cache:
+            self._edge_attribute_cache[code] = json.loads(
+                self._string(self._edge_attributes, self._edge_attribute_offsets, code)
+            )
+        return self._edge_attribute_cache[code]
+
+    def _successors(self, i):
+        start, end = self._out_offsets[i], self._out_offsets[i + 1]
+        return {
+            target: self._edge_attribute(code)
+            for target, code in zip(
+                self._out_targets[start:end], self._out_attributes[start:end]
+            )
+        }
+
+    def _successor_indices(self, i):
+        return self._out_targets[self._out_offsets[i] : self._out_offsets[i + 1]]
+
+    def _predecessor_indices(self, i):
+        return self._in_sources[self._in_offsets[i] : self._in_offsets[i + 1]]
+
+    def successors(self, node):
+        return (self._node_id(j) for j in self._successor_indices(self._index(node)))
+
+    def predecessors(self, node):
+        return (self._node_id(j) for j in self._predecessor_indices(self._index(node)))
+
+    def in_degree(self, node):
+        return len(self._predecessor_indices(self._index(node)))
+
+    def out_degree(self, node):
+        return len(self._successor_indices(self._index(node)))
+
+    def subgraph(self, nodes):
+        indices = {self._index(node): node for node in nodes}
+        sub_graph = nx.DiGraph()
+        for i, node in indices.items():
+            sub_graph.add_node(node, **self._attributes(i))
+        for i, node in indices.items():
+            for j, attributes in self._successors(i).items():
+                if j in indices:
+                    sub_graph.add_edge(node, indices[j], **attributes)
+        return sub_graph
+
+    def to_networkx(self):
+        return self.subgraph(self)
+
+    # nodes whose attributes overlap with all given ones, None requires the
+    # attribute to be missing
+    def _candidates(self, attributes):
+        result = None
+        missing = []
+        for key, value in attributes.items():
+            if value is None:
+                missing.append(key)
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            nodes = set()
+            for v in values:
+                code = self._term_code(_term(key, v))
+                if code is not None:
+                    nodes.update(self._posting(code))
+            result = nodes if result is None else result & nodes
+        if missing:
+            if result is None:
+                result = set(range(len(self)))
+            for key in missing:
+                prefix = json.dumps([key])[:-1].encode() + b", "
+                first = self._term_bound(prefix)
+                last = self._term_bound(prefix[:-1] + bytes([prefix[-1] + 1]))
+                for code in range(first, last):
+                    result.difference_update(self._posting(code))
+        return result
+
+    # match a pattern graph by joining the candidate sets of the pattern nodes
+    # along the adjacency, distinct pattern nodes match distinct nodes
+    def match_pattern(self, pattern_graph, steps=None):
+        pattern_nodes = list(pattern_graph.nodes)
+        # like the networkx matcher, a pattern node without attributes matches nothing
+        if not pattern_nodes or not all(
+            pattern_graph.nodes[node] for node in pattern_nodes
+        ):
+            return []
+        candidates = {
+            node: self._candidates(pattern_graph.nodes[node]) for node in pattern_nodes
+        }
+        pattern_nodes.sort(key=lambda node: len(candidates[node]))
+        if steps is not None:
+            for position, node in enumerate(pattern_nodes):
+                joined = [
+                    other
+                    for other in pattern_nodes[:position]
+                    if pattern_graph.has_edge(node, other)
+                    or pattern_graph.has_edge(other, node)
+                ]
+                access = "postings"
+                if joined:
+                    access += " joined with neighbours of " + ", ".join(joined)
+                steps.append(
+                    planner.PlanStep(
+                        node, estimated=len(candidates[node]), access=access
+                    )
+                )
+        matches = []
+
+        def extend(assignment, position):
+            if position == len(pattern_nodes):
+                matches.append(
+                    {node: self._node_id(i) for node, i in assignment.items()}
+                )
+                return
+            node = pattern_nodes[position]
+            options = candidates[node]
+            for predecessor in pattern_graph.predecessors(node):
+                if predecessor in assignment:
+                    options = options.intersection(
+                        self._successor_indices(assignment[predecessor])
+                    )
+            for successor in pattern_graph.successors(node):
+                if successor in assignment:
+                    options = options.intersection(
+                        self._predecessor_indices(assignment[successor])
+                    )
+            used = set(assignment.values())
+            for i in sorted(options):
+                if i not in used:
+                    if steps is not None:
+                        steps[position].actual += 1
+                    assignment[node] = i
+                    extend(assignment, position + 1)
+                    del assignment[node]
+
+        extend({}, 0)
+        return matches
+
+    # candidate set sizes and join order of match_pattern with the number of
+    # partial matches of every step
+    def explain_pattern(self, pattern_graph):
+        steps = []
+        matches = self.match_pattern(pattern_graph, steps)
+        return planner.Explanation(steps, len(matches))
+
+    # first node (in graph order) whose attributes equal the given ones
+    def find_node(self, attributes):
+        if "uuid" in attributes and attributes["uuid"] in self:
+            candidates = [self._index(attributes["uuid"])]
+        else:
+            first = {
+                key: value
+                for key, value in itertools.islice(attributes.items(), 1)
+                if value is not None and value != []
+            }
+            candidates = sorted(self._candidates(first)) if first else range(len(self))
+        for i in candidates:
+            node_attributes = self._attributes(i)
+            if all(
+                node_attributes.get(key) == value for key, value in attributes.items()
+            ):
+                return self._node_id(i)
+        return None
+
+
+class SharedDSL(memnet.DSL):
+    # read-only DSL on a graph published by SharedGraph.publish() or SharedGraph.save()
+    def __init__(self, name=None, file_path=None, cache_size=10000):
+        super().__init__()
+        if file_path:
+            self.graph = SharedGraph.load(file_path, cache_size=cache_size)
+        else:
+            self.graph = SharedGraph.attach(name, cache_size=cache_size)
+
+    def get_uuid(self, node_attributes):
+        return self.graph.find_node(node_attributes)
+
+    def _find_isomorphic_subgraphs(self, **attributes):
+        pattern_graph = self._create_pattern_graph(**attributes)
+        return [
+            self.graph.subgraph(match.values())
+            for match in self.graph.match_pattern(pattern_graph)
+        ]
+
+    def snapshot(self):
+        return self
+
+    def plan(self, **attributes):
+        raise NotImplementedError("SharedDSL matches patterns on its sorted arrays")
+
+    # join order of a query on the candidate sets and its number of matches
+    def explain(self, memory=None, **attributes):
+        pattern_graph = self._create_pattern_graph(
+            **self._query_attributes(memory, attributes)
+        )
+        return self.graph.explain_pattern(pattern_graph)
+
+    def close(self):
+        self.graph.close()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import networkx as nx
+import numpy as np
+import hashlib
+
+
+def _hash(label):
+    return int.from_bytes(
+        hashlib.blake2b(label.encode(), digest_size=8).digest(), "little"
+    )
+
+
+def _node_label(attributes):
+    utterances = attributes.get("utterances", [])
+    if isinstance(utterances, str):
+        utterances = [utterances]
+    return f"{attributes.get('type')}|{','.join(sorted(map(str, utterances)))}"
+
+
+class PatternIndex:
+    # similarity search for action patterns. Every action hub is described by
+    # Weisfeiler-Lehman label counts of its neighbourhood (type, utterances and
+    # link_type), stored as L2 normalized rows of a sparse CSR matrix. Queries
+    # score all rows at once with a sparse matrix-vector product.
+    def __init__(self, graph, hub_type="action", radius=1, iterations=2):
+        self.graph = graph
+        self.hub_type = hub_type
+        self.radius = radius
+        self.iterations = iterations
+        self.vocabulary = {}
+        self.rows = {}
+        # nodes of the indexed neighbourhood of every hub and the inverse
+        self._neighbourhoods = {}
+        self._containing_hubs = {}
+        self._hubs = []
+        self._memories = []
+        self._alive = []
+        self._indptr = [0]
+        self._indices = []
+        self._data = []
+        self._arrays = None
+        self.update(
+            node
+            for node, attributes in graph.nodes(data=True)
+            if attributes.get("type") == hub_type
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    # hub and the nodes reachable over up to radius outgoing links
+    def _neighbourhood(self, graph, hub):
+        nodes = {hub}
+        frontier = [hub]
+        for _ in range(self.radius):
+            frontier = [
+                successor
+                for node in frontier
+                for successor in graph.successors(node)
+                if successor not in nodes
+            ]
+            nodes.update(frontier)
+        return graph.subgraph(nodes)
+
+    def features(self, graph, hub):
+        return self._label_counts(self._neighbourhood(graph, hub))
+
+    def _label_counts(self, neighbourhood):
+        labels = {
+            node: _node_label(attributes)
+            for node, attributes in neighbourhood.nodes(data=True)
+        }
+        counts = {}
+        for iteration in range(self.iterations + 1):
+            for label in labels.values():
+                feature = _hash(f"{iteration}:{label}")
+                counts[feature] = counts.get(feature, 0) + 1
+            if iteration == self.iterations:
+                break
+            relabeled = {}
+            for node, label in labels.items():
+                neighbours = sorted(
+                    [
+                        f"o{link_type}:{labels[target]}"
+                        for _, target, link_type in neighbourhood.out_edges(
+                            node, data="link_type"
+                        )
+                    ]
+                    + [
+                        f"i{link_type}:{labels[source]}"
+                        for source, _, link_type in neighbourhood.in_edges(
+                            node, data="link_type"
+                        )
+                    ]
+                )
+                relabeled[node] = str(_hash(label + "(" + ";".join(neighbours) + ")"))
+            labels = relabeled
+        return counts
+
+    def _vector(self, counts, grow=False):
+        if grow:
+            for feature in counts:
+                self.vocabulary.setdefault(feature, len(self.vocabulary))
+        columns = [
+            (self.vocabulary[feature], count)
+            for feature, count in counts.items()
+            if feature in self.vocabulary
+        ]
+        columns.sort()
+        norm = sum(count * count for count in counts.values()) ** 0.5
+        return [column for column, _ in columns], [count / norm for _, count in columns]
+
+    # (re)index hubs, e.g. after nodes were added to their patterns
+    def update(self, hubs):
+        for hub in hubs:
+            self.remove(hub)
+            if hub not in self.graph:
+                continue
+            neighbourhood = self._neighbourhood(self.graph, hub)
+            self._neighbourhoods[hub] = set(neighbourhood)
+            for node in neighbourhood:
+                self._containing_hubs.setdefault(node, set()).add(hub)
+            indices, data = self._vector(self._label_counts(neighbourhood), grow=True)
+            self.rows[hub] = len(self._hubs)
+            self._hubs.append(hub)
+            self._memories.append(self.graph.nodes[hub].get("memory"))
+            self._alive.append(True)
+            self._indices.extend(indices)
+            self._data.extend(data)
+            self._indptr.append(len(self._indices))
+        self._arrays = None
+        if len(self._hubs) > 2 * len(self.rows) + 64:
+            self._compact()
+
+    def remove(self, hub):
+        row = self.rows.pop(hub, None)
+        for node in self._neighbourhoods.pop(hub, ()):
+            hubs = self._containing_hubs[node]
+            hubs.discard(hub)
+            if not hubs:
+                del self._containing_hubs[node]
+        if row is not None:
+            self._alive[row] = False
+            self._arrays = None
+
+    # hubs whose neighbourhood contains one of the changed nodes, either when it was
+    # indexed (also finds hubs of deleted nodes) or now
+    def refresh(self, nodes):
+        hubs = set()
+        for node in nodes:
+            hubs.update(self._containing_hubs.get(node, ()))
+            reached = {node}
+            frontier = [node]
+            for _ in range(self.radius):
+                frontier = [
+                    predecessor
+                    for current in frontier
+                    if current in self.graph
+                    for predecessor in self.graph.predecessors(current)
+                    if predecessor not in reached
+                ]
+                reached.update(frontier)
+            hubs.update(
+                hub
+                for hub in reached
+                if hub in self.rows
+                or (
+                    hub in self.graph
+                    and self.graph.nodes[hub].get("type") == self.hub_type
+                )
+            )
+            if node not in self.graph:
+                hubs.add(node)
+        self.update(hubs)
+
+    def _compact(self):
+        rows = sorted(self.rows.values())
+        indptr = [0]
+        indices = []
+        data = []
+        for row in rows:
+            start, end = self._indptr[row], self._indptr[row + 1]
+            indices.extend(self._indices[start:end])
+            data.extend(self._data[start:end])
+            indptr.append(len(indices))
+        self._hubs = [self._hubs[row] for row in rows]
+        self._memories = [self._memories[row] for row in rows]
+        self._alive = [True] * len(rows)
+        self._indptr, self._indices, self._data = indptr, indices, data
+        self.rows = {hub: row for row, hub in enumerate(self._hubs)}
+        self._arrays = None
+
+    def _matrix(self):
+        if self._arrays is None:
+            self._arrays = (
+                np.asarray(self._indptr, dtype=np.int64),
+                np.asarray(self._indices, dtype=np.int64),
+                np.asarray(self._data, dtype=np.float64),
+                np.asarray(self._alive, dtype=bool),
+                np.asarray(self._memories, dtype=object),
+            )
+        return self._arrays
+
+    # top-k stored patterns most similar to a hub of the graph or to a pattern sub
+    # graph (e.g. a result of get_stm_actions), as (hub, cosine similarity) pairs
+    def most_similar(self, pattern, k=5, memory=None, exclude=()):
+        if isinstance(pattern, nx.DiGraph):
+            hubs = [
+                node
+                for node, attributes in pattern.nodes(data=True)
+                if attributes.get("type") == self.hub_type
+                and pattern.in_degree(node) == 0
+            ]
+            counts = {}
+            for hub in hubs:
+                for feature, count in self.features(pattern, hub).items():
+                    counts[feature] = counts.get(feature, 0) + count
+            exclude = set(exclude) | set(hubs)
+        else:
+            counts = self.features(self.graph, pattern)
+            exclude = set(exclude) | {pattern}
+        if not counts or not self.rows:
+            return []
+
+        indptr, indices, data, alive, memories = self._matrix()
+        query = np.zeros(len(self.vocabulary))
+        columns, values = self._vector(counts)
+        query[columns] = values
+        # sparse matrix-vector product, every row has at least the hub label
+        scores = np.add.reduceat(data * query[indices], indptr[:-1])
+        mask = alive.copy()
+        if memory is not None:
+            memory = [memory] if isinstance(memory, str) else list(memory)
+            mask &= np.isin(memories, memory)
+        for hub in exclude:
+            if hub in self.rows:
+                mask[self.rows[hub]] = False
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return []
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._hubs[row], float(scores[row])) for row in top]
@@ -0,0 +1,581 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import networkx as nx
+from basicmemnet import memnet
+from basicmemnet import planner
+from collections import OrderedDict
+import json
+import re
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    uuid TEXT PRIMARY KEY,
+    type TEXT,
+    memory TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    uuid TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS edges (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    link_type TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, target)
+);
+CREATE INDEX IF NOT EXISTS nodes_type_memory ON nodes (type, memory);
+CREATE INDEX IF NOT EXISTS nodes_memory ON nodes (memory);
+CREATE INDEX IF NOT EXISTS attributes_key_value ON attributes (key, value, uuid);
+CREATE INDEX IF NOT EXISTS attributes_uuid ON attributes (uuid, key);
+CREATE INDEX IF NOT EXISTS edges_target ON edges (target, link_type);
+CREATE INDEX IF NOT EXISTS edges_link_type ON edges (link_type);
+"""
+
+# sqlite's limit of host parameters per statement is 999 in older versions
+CHUNK_SIZE = 500
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+# values of list attributes (utterances, accessid, ...) are indexed element-wise
+def _attribute_values(value):
+    values = value if isinstance(value, (list, tuple, set)) else [value]
+    return [json.dumps(v) for v in values if isinstance(v, (str, int, float, bool))]
+
+
+class _NodeView:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node):
+        return self._graph._node_entry(node)[0]
+
+    def __contains__(self, node):
+        return self._graph.has_node(node)
+
+    def __iter__(self):
+        return iter(self._graph)
+
+    def __len__(self):
+        return len(self._graph)
+
+    def __call__(self, data=False):
+        if not data:
+            return iter(self._graph)
+        cursor = self._graph.connection.execute("SELECT uuid, data FROM nodes")
+        return ((uuid, json.loads(data)) for uuid, data in cursor)
+
+
+class _EdgeView:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        source, target = edge
+        return self._graph._node_entry(source)[1][target]
+
+
+class SQLiteGraph:
+    # out-of-core directed graph, providing the part of the networkx.DiGraph
+    # interface the DSL uses. Recently used nodes are kept in a bounded cache
+    # together with their adjacency.
+    def __init__(self, database, cache_size=10000, snapshot=False):
+        self.database = database
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        if snapshot:
+            # read-only, the open read transaction keeps seeing the database version
+            # of its first read while other connections write (WAL mode)
+            self.connection.execute("PRAGMA query_only=ON")
+            self.connection.execute("BEGIN")
+            self.connection.execute("SELECT COUNT(*) FROM nodes").fetchone()
+        else:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self.nodes = _NodeView(self)
+        self.edges = _EdgeView(self)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def __iter__(self):
+        cursor = self.connection.execute("SELECT uuid FROM nodes ORDER BY rowid")
+        return (uuid for (uuid,) in cursor)
+
+    def __contains__(self, node):
+        return self.has_node(node)
+
+    def number_of_edges(self):
+        return self.connection.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+
+    def has_node(self, node):
+        if node in self._cache:
+            return True
+        row = self.connection.execute(
+            "SELECT 1 FROM nodes WHERE uuid = ?", (node,)
+        ).fetchone()
+        return row is not None
+
+    # (attributes, successors, predecessors) of a node, loaded on a cache miss
+    def _node_entry(self, node):
+        with self._lock:
+            if node in self._cache:
+                self._cache.move_to_end(node)
+                return self._cache[node]
+            row = self.connection.execute(
+                "SELECT data FROM nodes WHERE uuid = ?", (node,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(node)
+            successors = {
+                target: json.loads(data)
+                for target, data in self.connection.execute(
+                    "SELECT target, data FROM edges WHERE source = ?", (node,)
+                )
+            }
+            predecessors = [
+                source
+                for (source,) in self.connection.execute(
+                    "SELECT source FROM edges WHERE target = ?", (node,)
+                )
+            ]
+            entry = (json.loads(row[0]), successors, predecessors)
+            self._cache[node] = entry
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return entry
+
+    def _invalidate(self, nodes):
+        with self._lock:
+            for node in nodes:
+                self._cache.pop(node, None)
+
+    def successors(self, node):
+        return iter(list(self._node_entry(node)[1]))
+
+    def predecessors(self, node):
+        return iter(list(self._node_entry(node)[2]))
+
+    def in_degree(self, node):
+        return len(self._node_entry(node)[2])
+
+    def out_degree(self, node):
+        return len(self._node_entry(node)[1])
+
+    def _write_node(self, node, attributes):
+        row = self.connection.execute(
+            "SELECT data FROM nodes WHERE uuid = ?", (node,)
+        ).fetchone()
+        data = json.loads(row[0]) if row else {}
+        data.update(attributes)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO nodes (uuid, type, memory, data) VALUES (?, ?, ?, ?)",
+            (node, data.get("type"), data.get("memory"), json.dumps(data)),
+        )
+        for key, value in attributes.items():
+            if key in ("type", "memory"):
+                continue
+            self.connection.execute(
+                "DELETE FROM attributes WHERE uuid = ? AND key = ?", (node, key)
+            )
+            self.connection.executemany(
+                "INSERT INTO attributes (uuid, key, value) VALUES (?, ?, ?)",
+                [(node, key, value) for value in _attribute_values(value)],
+            )
+
+    def _write_edge(self, source, target, attributes):
+        for node in (source, target):
+            self.connection.execute(
+                "INSERT OR IGNORE INTO nodes (uuid, data) VALUES (?, '{}')", (node,)
+            )
+        row = self.connection.execute(
+            "SELECT data FROM edges WHERE source = ? AND target = ?", (source, target)
+        ).fetchone()
+        data = json.loads(row[0]) if row else {}
+        data.update(attributes)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO edges (source, target, link_type, data) VALUES (?, ?, ?, ?)",
+            (source, target, data.get("link_type"), json.dumps(data)),
+        )
+
+    def add_node(self, node, **attributes):
+        with self._lock, self.connection:
+            self._write_node(node, attributes)
+            self._invalidate([node])
+
+    def add_edge(self, source, target, **attributes):
+        with self._lock, self.connection:
+            self._write_edge(source, target, attributes)
+            self._invalidate([source, target])
+
+    def clear(self):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM edges")
+            self.connection.execute("DELETE FROM attributes")
+            self.connection.execute("DELETE FROM nodes")
+            self._cache.clear()
+
+    def remove_nodes_from(self, nodes):
+        nodes = list(nodes)
+        with self._lock, self.connection:
+            neighbours = set(nodes)
+            # two IN lists per statement
+            for chunk in _chunks(nodes, CHUNK_SIZE // 2):
+                marks = ",".join("?" * len(chunk))
+                for source, target in self.connection.execute(
+                    f"SELECT source, target FROM edges WHERE source IN ({marks}) OR target IN ({marks})",
+                    chunk + chunk,
+                ):
+                    neighbours.update((source, target))
+                self.connection.execute(
+                    f"DELETE FROM edges WHERE source IN ({marks}) OR target IN ({marks})",
+                    chunk + chunk,
+                )
+                self.connection.execute(
+                    f"DELETE FROM attributes WHERE uuid IN ({marks})", chunk
+                )
+                self.connection.execute(
+                    f"DELETE FROM nodes WHERE uuid IN ({marks})", chunk
+                )
+            self._invalidate(neighbours)
+
+    # bulk insert of a networkx graph in one transaction, attributes of existing
+    # nodes and edges are updated like in networkx
+    def add_graph(self, graph):
+        with self._lock, self.connection:
+            existing_nodes = {}
+            existing_edges = {}
+            for chunk in _chunks(graph.nodes):
+                marks = ",".join("?" * len(chunk))
+                for node, data in self.connection.execute(
+                    f"SELECT uuid, data FROM nodes WHERE uuid IN ({marks})", chunk
+                ):
+                    existing_nodes[node] = json.loads(data)
+                for source, target, data in self.connection.execute(
+                    f"SELECT source, target, data FROM edges WHERE source IN ({marks})",
+                    chunk,
+                ):
+                    existing_edges[source, target] = json.loads(data)
+
+            node_rows = []
+            stale_attributes = []
+            attribute_rows = []
+            for node, attributes in graph.nodes(data=True):
+                data = existing_nodes.get(node, {})
+                data.update(attributes)
+                node_rows.append(
+                    (node, data.get("type"), data.get("memory"), json.dumps(data))
+                )
+                for key, value in attributes.items():
+                    if key in ("type", "memory"):
+                        continue
+                    if node in existing_nodes:
+                        stale_attributes.append((node, key))
+                    attribute_rows.extend(
+                        (node, key, v) for v in _attribute_values(value)
+                    )
+
+            edge_rows = []
+            for source, target, attributes in graph.edges(data=True):
+                data = existing_edges.get((source, target), {})
+                data.update(attributes)
+                edge_rows.append(
+                    (source, target, data.get("link_type"), json.dumps(data))
+                )
+
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO nodes (uuid, type, memory, data) VALUES (?, ?, ?, ?)",
+                node_rows,
+            )
+            self.connection.executemany(
+                "DELETE FROM attributes WHERE uuid = ? AND key = ?", stale_attributes
+            )
+            self.connection.executemany(
+                "INSERT INTO attributes (uuid, key, value) VALUES (?, ?, ?)",
+                attribute_rows,
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO edges (source, target, link_type, data) VALUES (?, ?, ?, ?)",
+                edge_rows,
+            )
+            self._cache.clear()
+        # update the statistics of the query planner after large changes
+        self.connection.execute("PRAGMA optimize")
+
+    def subgraph(self, nodes):
+        nodes = list(dict.fromkeys(nodes))
+        sub_graph = nx.DiGraph()
+        for node in nodes:
+            sub_graph.add_node(node, **self._node_entry(node)[0])
+        for node in nodes:
+            for successor, attributes in self._node_entry(node)[1].items():
+                if successor in sub_graph:
+                    sub_graph.add_edge(node, successor, **attributes)
+        return sub_graph
+
+    def to_networkx(self):
+        graph = nx.DiGraph()
+        for node, data in self.connection.execute(
+            "SELECT uuid, data FROM nodes ORDER BY rowid"
+        ):
+            graph.add_node(node, **json.loads(data))
+        for source, target, data in self.connection.execute(
+            "SELECT source, target, data FROM edges"
+        ):
+            graph.add_edge(source, target, **json.loads(data))
+        return graph
+
+    def _node_conditions(self, alias, attributes):
+        conditions = []
+        parameters = []
+        for key, value in attributes.items():
+            if key in ("type", "memory"):
+                conditions.append(f"{alias}.{key} IS ?")
+                parameters.append(value)
+                continue
+            values = _attribute_values(value)
+            marks = ",".join("?" * len(values))
+            conditions.append(
+                f"{alias}.uuid IN (SELECT uuid FROM attributes WHERE key = ? AND value IN ({marks}))"
+            )
+            parameters.extend([key] + values)
+        return conditions, parameters
+
+    # match a pattern graph with indexed sql: one join per pattern node, pattern
+    # edges become edge lookups, distinct pattern nodes match distinct nodes
+    def match_pattern(self, pattern_graph):
+        built = self._pattern_query(pattern_graph)
+        if built is None:
+            return []
+        pattern_nodes, _, query, parameters = built
+        return [
+            dict(zip(pattern_nodes, row))
+            for row in self.connection.execute(query, parameters)
+        ]
+
+    # sqlite's query plan of match_pattern, one step per line of EXPLAIN QUERY PLAN
+    def explain_pattern(self, pattern_graph):
+        built = self._pattern_query(pattern_graph)
+        if built is None:
+            return planner.Explanation([], 0)
+        _, aliases, query, parameters = built
+        pattern_nodes = {alias: node for node, alias in aliases.items()}
+        steps = []
+        for _, _, _, detail in self.connection.execute(
+            "EXPLAIN QUERY PLAN " + query, parameters
+        ):
+            alias = next(
+                (
+                    alias
+                    for alias in re.findall(r"\bn\d+\b", detail)
+                    if alias in pattern_nodes
+                ),
+                None,
+            )
+            step = planner.PlanStep(
+                pattern_nodes.get(alias, ""), estimated=None, access=detail
+            )
+            step.actual = None
+            steps.append(step)
+        rows = sum(1 for _ in self.connection.execute(query, parameters))
+        return planner.Explanation(steps, rows)
+
+    # one join of the nodes table per pattern node
+    def _pattern_query(self, pattern_graph):
+        pattern_nodes = list(pattern_graph.nodes)
+        # like the networkx matcher, a pattern node without attributes matches nothing
+        if not pattern_nodes or not all(
+            pattern_graph.nodes[node] for node in pattern_nodes
+        ):
+            return None
+        aliases = {node: f"n{i}" for i, node in enumerate(pattern_nodes)}
+        conditions = []
+        parameters = []
+        for node in pattern_nodes:
+            node_conditions, node_parameters = self._node_conditions(
+                aliases[node], pattern_graph.nodes[node]
+            )
+            conditions.extend(node_conditions)
+            parameters.extend(node_parameters)
+        for source, target in pattern_graph.edges:
+            conditions.append(
+                f"EXISTS (SELECT 1 FROM edges WHERE source = {aliases[source]}.uuid "
+                f"AND target = {aliases[target]}.uuid)"
+            )
+        for i, first in enumerate(pattern_nodes):
+            for second in pattern_nodes[i + 1 :]:
+                conditions.append(f"{aliases[first]}.uuid != {aliases[second]}.uuid")
+
+        columns = ", ".join(f"{aliases[node]}.uuid" for node in pattern_nodes)
+        tables = ", ".join(f"nodes {aliases[node]}" for node in pattern_nodes)
+        where = " AND ".join(conditions) if conditions else "1"
+        query = f"SELECT {columns} FROM {tables} WHERE {where}"
+        return pattern_nodes, aliases, query, parameters
+
+    # first node (in insertion order) whose attributes equal the given ones
+    def find_node(self, attributes):
+        if "uuid" in attributes:
+            candidates = (
+                [attributes["uuid"]] if self.has_node(attributes["uuid"]) else []
+            )
+        else:
+            conditions = []
+            parameters = []
+            for key, value in attributes.items():
+                if key in ("type", "memory"):
+                    conditions.append(f"n.{key} IS ?")
+                    parameters.append(value)
+                elif _attribute_values(value):
+                    conditions.append(
+                        "n.uuid IN (SELECT uuid FROM attributes WHERE key = ? AND value = ?)"
+                    )
+                    parameters.extend([key, _attribute_values(value)[0]])
+            where = " AND ".join(conditions) if conditions else "1"
+            candidates = (
+                uuid
+                for (uuid,) in self.connection.execute(
+                    f"SELECT n.uuid FROM nodes n WHERE {where} ORDER BY n.rowid",
+                    parameters,
+                )
+            )
+        for node in candidates:
+            node_attributes = self._node_entry(node)[0]
+            if all(
+                node_attributes.get(key) == value for key, value in attributes.items()
+            ):
+                return node
+        return None
+
+    # node and all its ancestors along spec_to links
+    def spec_to_ancestors(self, node):
+        cursor = self.connection.execute(
+            """
+            WITH RECURSIVE ancestors(uuid) AS (
+                SELECT ?
+                UNION
+                SELECT edges.source FROM edges
+                JOIN ancestors ON edges.target = ancestors.uuid
+                WHERE edges.link_type = 'spec_to'
+            )
+            SELECT uuid FROM ancestors
+            """,
+            (node,),
+        )
+        return [uuid for (uuid,) in cursor]
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLiteDSL(memnet.DSL):
+    # DSL on an sqlite database instead of an in-memory networkx graph
+    def __init__(self, database, use_wordnet=False, json_file=None, cache_size=10000):
+        super().__init__()
+        self.graph = SQLiteGraph(database, cache_size=cache_size)
+        # patterns are matched by sqlite, not by the planner of DSL
+        self.use_planner = False
+        # WordNet is only imported into a new database
+        if use_wordnet and len(self.graph) == 0:
+            from basicmemnet import word2memnet
+
+            self.graph.add_graph(word2memnet.create_wordnet_graph())
+        if json_file:
+            self.load_from_json(json_file)
+
+    def open_journal(self, journal_dir, **kwargs):
+        raise NotImplementedError("SQLiteDSL persists all changes in its database")
+
+    # snapshots read the database on their own connection instead of copying it
+    def _snapshot_graph(self):
+        if self.graph.database == ":memory:":
+            raise NotImplementedError("snapshots need a database file")
+        return SQLiteGraph(
+            self.graph.database, cache_size=self.graph.cache_size, snapshot=True
+        )
+
+    def plan(self, **attributes):
+        raise NotImplementedError("SQLiteDSL queries are planned by sqlite")
+
+    # sqlite's plan of a query and its number of matches
+    def explain(self, memory=None, **attributes):
+        pattern_graph = self._create_pattern_graph(
+            **self._query_attributes(memory, attributes)
+        )
+        return self.graph.explain_pattern(pattern_graph)
+
+    def export_gml(self, graph_file):
+        nx.write_gml(self.graph.to_networkx(), graph_file)
+
+    # replace the database content by the gml graph, like DSL.import_gml
+    @memnet._writes
+    def import_gml(self, graph_file):
+        graph = nx.read_gml(graph_file)
+        self.graph.clear()
+        self.graph.add_graph(graph)
+
+    def _merge_graph(self, graph):
+        self.graph.add_graph(graph)
+
+    def get_uuid(self, node_attributes):
+        return self.graph.find_node(node_attributes)
+
+    def get_parents(self, **attributes):
+        sub_graphs = self._find_isomorphic_subgraphs(**attributes)
+        hub_nodes = self.get_hub_nodes(sub_graphs)
+        return [
+            self.graph.subgraph(self.graph.spec_to_ancestors(node))
+            for node in hub_nodes
+        ]
+
+    def _find_isomorphic_subgraphs(self, **attributes):
+        pattern_graph = self._create_pattern_graph(**attributes)
+        return [
+            self.graph.subgraph(match.values())
+            for match in self.graph.match_pattern(pattern_graph)
+        ]
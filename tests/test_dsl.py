@@ -37,6 +37,11 @@
 import unittest
 import sys
 import os
+import subprocess
+import copy
+import tempfile
+import threading
+import networkx as nx
 from basicmemnet import memnet
 
 
@@ -68,6 +73,231 @@ class TestMemNet(unittest.TestCase):
         sub_graphs = md.get_stm_objects(object_attributes={"utterances": ["glass"]})
         self.assertEqual(len(sub_graphs), 1)
 
+    def test_lazy_imports(self):
+        code = (
+            "import sys\n"
+            "from basicmemnet import memnet\n"
+            "memnet.DSL()\n"
+            "print([m for m in ['nltk', 'matplotlib', 'bson'] if m in sys.modules])"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+        self.assertTrue(hasattr(memnet.DSL, "get_stm_actions"))
+
+    def test_unique_sub_graphs(self):
+        md = memnet.DSL(use_wordnet=False)
+        md.import_gml(
+            os.path.join(
+                sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+            )
+        )
+        attributes = {"action_attributes": {"utterances": ["pour"]}}
+        sub_graphs = md.get_stm_agents(**attributes)
+        all_sub_graphs = md.get_stm_agents(unique=False, **attributes)
+        node_sets = [frozenset(sub_graph.nodes) for sub_graph in sub_graphs]
+        self.assertEqual(len(node_sets), len(set(node_sets)))
+        self.assertLess(len(sub_graphs), len(all_sub_graphs))
+        self.assertEqual(
+            set(node_sets), {frozenset(sub_graph.nodes) for sub_graph in all_sub_graphs}
+        )
+
+    def test_merge_gml(self):
+        graph = nx.read_gml(
+            os.path.join(
+                sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+            )
+        )
+        roots = [node for node in graph if graph.in_degree(node) == 0]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # one file per episode, agents and objects shared between episodes
+            graph_files = []
+            for i, root in enumerate(roots[:20]):
+                episode = graph.subgraph({root} | nx.descendants(graph, root))
+                graph_files.append(os.path.join(temp_dir, f"episode_{i}.gml"))
+                nx.write_gml(episode, graph_files[-1])
+            md = memnet.DSL(use_wordnet=False)
+            md.merge_gml(graph_files, workers=2)
+
+        expected = graph.subgraph(
+            set(roots[:20]).union(*(nx.descendants(graph, root) for root in roots[:20]))
+        )
+        self.assertEqual(set(md.graph.nodes), set(expected.nodes))
+        self.assertEqual(set(md.graph.edges), set(expected.edges))
+
+    def test_merge_gml_accessid(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph_files = []
+            for i in range(2):
+                graph = nx.DiGraph()
+                graph.add_node(
+                    f"concept_{i}", accessid="glass.n.01", uuid=f"concept_{i}"
+                )
+                graph.add_node(f"object_{i}", utterances=["glass"], uuid=f"object_{i}")
+                graph.add_edge(f"concept_{i}", f"object_{i}", link_type="spec_to")
+                graph_files.append(os.path.join(temp_dir, f"episode_{i}.gml"))
+                nx.write_gml(graph, graph_files[-1])
+            md = memnet.DSL(use_wordnet=False)
+            md.merge_gml(graph_files, workers=1)
+
+        self.assertEqual(len(md.graph), 3)
+        self.assertEqual(md.graph.nodes["concept_0"]["uuid"], "concept_0")
+        self.assertEqual(
+            set(md.graph.successors("concept_0")), {"object_0", "object_1"}
+        )
+
+    def test_snapshot_copy_on_write(self):
+        md = memnet.DSL(
+            use_wordnet=False,
+            json_file=os.path.join(sys.path[0], "data", "action_patterns.json"),
+        )
+
+        def state(graph):
+            return (
+                copy.deepcopy(dict(graph.nodes(data=True))),
+                copy.deepcopy(sorted(graph.edges(data=True))),
+            )
+
+        snapshot = md.snapshot()
+        before = state(snapshot.graph)
+        glass = md.get_uuid({"utterances": ["glass"], "memory": "stm"})
+        source, target = next(iter(md.graph.edges))
+        md.create_linked_node(None, {"uuid": glass, "utterances": ["mug"]})
+        md.add_link(source, target, link_type="changed")
+        md.add_link(target, glass, link_type="has_part")
+        md.delete_sub_graphs([md.graph.subgraph([source])])
+        self.assertEqual(state(snapshot.graph), before)
+
+        # a thread sees its own writes in the next snapshot
+        self.assertEqual(
+            len(
+                md.snapshot().get_stm_objects(object_attributes={"utterances": ["mug"]})
+            ),
+            1,
+        )
+        self.assertEqual(state(md.snapshot().graph), state(md.graph))
+
+    def test_query_planner(self):
+        md = memnet.DSL(use_wordnet=False)
+        md.import_gml(
+            os.path.join(
+                sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+            )
+        )
+        queries = [
+            {"action_attributes": {"utterances": ["pour"]}},
+            {"object_attributes": {"utterances": ["cereals"]}},
+            {
+                "action_attributes": {"utterances": ["approach", "pour"]},
+                "object_attributes": {"utterances": ["cereals"]},
+            },
+        ]
+
+        def node_sets(use_planner, query):
+            md.use_planner = use_planner
+            return sorted(
+                sorted(sub_graph.nodes)
+                for sub_graph in md.get_stm_actions(unique=False, **query)
+            )
+
+        for query in queries:
+            self.assertEqual(node_sets(True, query), node_sets(False, query))
+
+        # statistics follow the changes made through the DSL
+        md.delete_sub_graphs(md.get_stm_actions(**queries[2])[:1])
+        md.create_linked_node(
+            None,
+            {"type": "object", "utterances": ["cereals"], "memory": "stm"},
+        )
+        for query in queries:
+            self.assertEqual(node_sets(True, query), node_sets(False, query))
+        self.assertEqual(md._statistics.edge_count, md.graph.number_of_edges())
+
+        # direct changes of the graph, the node count stays the same
+        graph = md.get_graph()
+        cereals = [
+            next(iter(sub_graph))
+            for sub_graph in md.get_nodes(
+                object_attributes={"utterances": ["cereals"], "memory": "stm"}
+            )
+        ]
+        graph.nodes[cereals[0]]["utterances"] = ["mug"]
+        graph.add_node("mug", type="object", utterances=["mug"], memory="stm")
+        graph.remove_node(cereals[1])
+        queries.append({"object_attributes": {"utterances": ["mug"]}})
+        for query in queries:
+            self.assertEqual(node_sets(True, query), node_sets(False, query))
+        self.assertEqual(len(md.get_stm_objects(**queries[-1])), 2)
+
+        plan = md.explain(memory="stm", **queries[2])
+        self.assertEqual(
+            [step.pattern_node for step in plan.steps], ["object_node", "action_node"]
+        )
+        self.assertEqual(plan.steps[1].access(), "predecessors of object_node")
+        self.assertEqual(
+            plan.steps[-1].actual, len(md.get_stm_actions(unique=False, **queries[2]))
+        )
+        self.assertIn("estimated", str(plan))
+
+    def test_concurrent_snapshots(self):
+        md = memnet.DSL(
+            use_wordnet=False,
+            json_file=os.path.join(sys.path[0], "data", "action_patterns.json"),
+        )
+        attributes = {"action_attributes": {"utterances": ["hand over"]}}
+        writes = 300
+        errors = []
+        counts = []
+        done = threading.Event()
+
+        def write():
+            try:
+                for i in range(writes):
+                    md.create_linked_node(
+                        {"uuid": "658190c06eccd77ab5dc84d4"},
+                        {
+                            "type": "action",
+                            "utterances": ["hand over"],
+                            "memory": "stm",
+                        },
+                        link_type="has_object",
+                    )
+            except Exception as e:
+                errors.append(e)
+            done.set()
+
+        def read():
+            try:
+                reader_counts = []
+                while not done.is_set():
+                    sub_graphs = md.snapshot().get_stm_actions(**attributes)
+                    reader_counts.append(len(sub_graphs))
+                counts.append(reader_counts)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        writer = threading.Thread(target=write)
+        for thread in readers + [writer]:
+            thread.start()
+        for thread in readers + [writer]:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for reader_counts in counts:
+            self.assertEqual(reader_counts, sorted(reader_counts))
+        self.assertEqual(len(md.snapshot().get_stm_actions(**attributes)), writes + 1)
+
+        snapshot = md.snapshot()
+        with self.assertRaises(nx.NetworkXError):
+            snapshot.create_linked_node(None, {"type": "action"})
+
+        # within snapshot_interval the previous snapshot is reused
+        md.snapshot_interval = 60.0
+        md.create_linked_node(None, {"type": "action", "utterances": ["hand over"]})
+        self.assertIs(md.snapshot(), snapshot)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import sys
+import os
+import tempfile
+import time
+from basicmemnet import memnet
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.journal_dir = self.temp_dir.name
+        self.json_file = os.path.join(sys.path[0], "data", "action_patterns.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_recover(self):
+        md = memnet.DSL(journal_dir=self.journal_dir, json_file=self.json_file)
+        sub_graphs = md.get_stm_objects(object_attributes={"utterances": ["glass"]})
+        md.delete_sub_graphs(sub_graphs)
+        md.journal.commit()
+        # no close_journal(), simulate a crash
+        recovered = memnet.DSL(journal_dir=self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        self.assertEqual(set(recovered.graph.edges), set(md.graph.edges))
+        md.close_journal()
+        recovered.close_journal()
+
+    def test_torn_record(self):
+        md = memnet.DSL(journal_dir=self.journal_dir, json_file=self.json_file)
+        md.close_journal()
+        journal_file = os.path.join(self.journal_dir, "journal.0.bin")
+        with open(journal_file, "ab") as file:
+            file.write(b"\x20\x00\x00\x00torn")
+        recovered = memnet.DSL(journal_dir=self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        recovered.close_journal()
+
+    def test_compaction(self):
+        md = memnet.DSL(journal_dir=self.journal_dir, json_file=self.json_file)
+        md.compact_journal()
+        md.create_linked_node(
+            {"utterances": ["glass"]},
+            {"type": "object", "utterances": ["water"], "memory": "stm"},
+            link_type="has_part",
+        )
+        md.close_journal()
+        self.assertEqual(
+            sorted(os.listdir(self.journal_dir)), ["journal.1.bin", "snapshot.gml"]
+        )
+        recovered = memnet.DSL(journal_dir=self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        self.assertEqual(set(recovered.graph.edges), set(md.graph.edges))
+        recovered.close_journal()
+
+    def test_commit_interval(self):
+        md = memnet.DSL()
+        md.open_journal(self.journal_dir, group_size=1000, commit_interval=0.05)
+        md.create_linked_node(
+            None, {"type": "object", "utterances": ["glass"], "memory": "stm"}
+        )
+        # committed by the flusher without any further write
+        time.sleep(0.5)
+        recovered = memnet.DSL(journal_dir=self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        md.close_journal()
+        recovered.close_journal()
+
+    def test_import_gml(self):
+        md = memnet.DSL(journal_dir=self.journal_dir, json_file=self.json_file)
+        md.import_gml(
+            os.path.join(
+                sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+            )
+        )
+        md.create_linked_node(
+            None, {"type": "object", "utterances": ["water"], "memory": "stm"}
+        )
+        md.journal.commit()
+        recovered = memnet.DSL(journal_dir=self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        self.assertEqual(set(recovered.graph.edges), set(md.graph.edges))
+        md.close_journal()
+        recovered.close_journal()
+
+    def test_merge_gml(self):
+        md = memnet.DSL(journal_dir=self.journal_dir, json_file=self.json_file)
+        md.merge_gml(
+            [
+                os.path.join(
+                    sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+                )
+            ]
+        )
+        md.journal.commit()
+        recovered = memnet.DSL(journal_dir=self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        self.assertEqual(set(recovered.graph.edges), set(md.graph.edges))
+        md.close_journal()
+        recovered.close_journal()
+
+    def test_regenerated_base_graph(self):
+        def base():
+            # new uuids on every start, like the WordNet graph
+            md = memnet.DSL()
+            md.create_linked_node(
+                None, {"type": "object", "utterances": ["glass"], "memory": "ltm"}
+            )
+            return md
+
+        md = base()
+        md.open_journal(self.journal_dir)
+        md.create_linked_node(
+            {"utterances": ["glass"], "memory": "ltm"},
+            {"type": "object", "utterances": ["glass"], "memory": "stm"},
+            link_type="spec_to",
+        )
+        md.close_journal()
+        recovered = base()
+        recovered.open_journal(self.journal_dir)
+        self.assertEqual(set(recovered.graph.nodes), set(md.graph.nodes))
+        self.assertEqual(set(recovered.graph.edges), set(md.graph.edges))
+        recovered.close_journal()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import sys
+import os
+import networkx as nx
+from basicmemnet import plot_graph
+
+
+class TestAggregatedView(unittest.TestCase):
+    def test_collapse_chain(self):
+        graph = nx.DiGraph()
+        graph.add_node("task", type="action", utterances=["task"])
+        for i in range(6):
+            graph.add_node(i, type="action", utterances=[f"step {i}"])
+            graph.add_edge("task", i, link_type="has_element")
+            if i > 0:
+                graph.add_edge(i - 1, i, link_type="has_next")
+        view = plot_graph.AggregatedView(graph, depth=1)
+        view_graph = view.build()
+        segments = [
+            node
+            for node, attr in view_graph.nodes(data=True)
+            if attr.get("aggregate") == "segment"
+        ]
+        self.assertEqual(len(view_graph), 2)
+        self.assertEqual(view_graph.nodes[segments[0]]["size"], 6)
+
+        view.expand(segments[0])
+        self.assertEqual(len(view.build()), 7)
+
+    def test_episode(self):
+        graph = nx.read_gml(
+            os.path.join(
+                sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+            )
+        )
+        focus = next(iter(graph))
+        view = plot_graph.AggregatedView(graph, focus=focus, depth=2)
+        view_graph = view.build()
+        self.assertLess(len(view_graph), 50)
+        hidden = [
+            node
+            for node, attr in view_graph.nodes(data=True)
+            if attr.get("aggregate") == "hidden"
+        ]
+        self.assertTrue(hidden)
+
+        size = view_graph.nodes[hidden[0]]["size"]
+        revealed = view.members[hidden[0]][1][: view.max_children]
+        view.expand(hidden[0])
+        expanded_graph = view.build()
+        self.assertLess(expanded_graph.nodes[hidden[0]]["size"], size)
+        # revealed nodes are shown, either as nodes or inside a segment
+        shown = set(expanded_graph).union(
+            *(members for kind, members in view.members.values() if kind == "segment")
+        )
+        self.assertTrue(set(revealed) <= shown)
+
+    def test_spec_to_cycle(self):
+        graph = nx.DiGraph()
+        graph.add_node("root", type="object", utterances=["root"])
+        for node in ["a", "b"]:
+            graph.add_node(node, type="object", utterances=[node])
+        graph.add_edge("root", "a", link_type="spec_to")
+        graph.add_edge("a", "b", link_type="spec_to")
+        graph.add_edge("b", "a", link_type="spec_to")
+        view = plot_graph.AggregatedView(graph, depth=0)
+        view_graph = view.build()
+        self.assertEqual(view._subtree_size("root"), 3)
+        self.assertIn("root", view_graph)
+
+    def test_plot_focus_not_in_graph(self):
+        graph = nx.DiGraph()
+        graph.add_node("task", type="action", utterances=["task"])
+        view_graph = plot_graph.AggregatedView(graph, focus="missing").build()
+        self.assertEqual(list(view_graph), ["task"])
+
+
+if __name__ == "__main__":
+    unittest.main()
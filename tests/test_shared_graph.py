@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import sys
+import os
+import tempfile
+import multiprocessing
+from basicmemnet import memnet
+from basicmemnet import shared_graph
+
+ATTRIBUTES = {
+    "action_attributes": {"utterances": ["hand over"]},
+    "object_attributes": {"utterances": ["glass"]},
+}
+
+
+def query(name):
+    md = shared_graph.SharedDSL(name)
+    sub_graphs = md.get_stm_actions(**ATTRIBUTES)
+    edges = [sorted(sub_graph.edges) for sub_graph in sub_graphs]
+    md.close()
+    return edges
+
+
+class TestSharedGraph(unittest.TestCase):
+    def setUp(self):
+        self.md = memnet.DSL(
+            json_file=os.path.join(sys.path[0], "data", "action_patterns.json")
+        )
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "memory.bin")
+            shared_graph.SharedGraph.save(self.md.graph, file_path)
+            md = shared_graph.SharedDSL(file_path=file_path)
+            graph = md.graph.to_networkx()
+            self.assertEqual(
+                dict(graph.nodes(data=True)), dict(self.md.graph.nodes(data=True))
+            )
+            self.assertEqual(
+                sorted(graph.edges(data="link_type")),
+                sorted(self.md.graph.edges(data="link_type")),
+            )
+            self.assertEqual(
+                md.get_uuid({"utterances": ["glass"]}),
+                self.md.get_uuid({"utterances": ["glass"]}),
+            )
+            self.assertEqual(
+                len(md.get_stm_objects(object_attributes={"utterances": ["glass"]})), 1
+            )
+            md.close()
+
+    def test_explain(self):
+        attributes = {
+            "action_attributes": {"utterances": ["hand over"]},
+            "object_attributes": {"utterances": ["glass"]},
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "memory.bin")
+            shared_graph.SharedGraph.save(self.md.graph, file_path)
+            md = shared_graph.SharedDSL(file_path=file_path)
+            explanation = md.explain(memory="stm", **attributes)
+            self.assertEqual(explanation.rows, len(md.get_stm_actions(**attributes)))
+            self.assertEqual(
+                {step.pattern_node for step in explanation.steps},
+                {"action_node", "object_node"},
+            )
+            self.assertLessEqual(
+                explanation.steps[0].estimated, explanation.steps[1].estimated
+            )
+            self.assertIn("joined with neighbours", str(explanation))
+            md.close()
+
+    def test_worker_processes(self):
+        published = shared_graph.SharedGraph.publish(self.md.snapshot().graph)
+        try:
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(2) as pool:
+                results = pool.map(query, [published.name] * 2)
+        finally:
+            published.close()
+            published.unlink()
+        expected = [
+            sorted(sub_graph.edges)
+            for sub_graph in self.md.get_stm_actions(**ATTRIBUTES)
+        ]
+        self.assertEqual(results, [expected, expected])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import sys
+import os
+from basicmemnet import memnet
+from basicmemnet import similarity
+
+
+class TestPatternIndex(unittest.TestCase):
+    def setUp(self):
+        self.md = memnet.DSL(
+            json_file=os.path.join(sys.path[0], "data", "action_patterns.json")
+        )
+        # a stored mtm pattern like the observed one, without the recipient
+        action = self.md.create_linked_node(
+            None, {"type": "action", "utterances": ["hand over"], "memory": "mtm"}
+        )
+        self.mtm_object = self.md.create_linked_node(
+            {"uuid": action["uuid"]},
+            {"type": "object", "utterances": ["glass"], "memory": "mtm"},
+            link_type="has_object",
+        )
+        self.mtm_action = action["uuid"]
+        self.mtm_object = self.mtm_object["uuid"]
+        self.stm_action = "658021a16eccd76b333ec506"
+
+    def test_most_similar(self):
+        index = similarity.PatternIndex(self.md.graph)
+        self.assertEqual(len(index), 2)
+        results = index.most_similar(self.stm_action, k=3, memory=["mtm", "ltm"])
+        self.assertEqual([hub for hub, _ in results], [self.mtm_action])
+        self.assertGreater(results[0][1], 0.0)
+        self.assertLess(results[0][1], 1.0)
+
+        sub_graphs = self.md.get_stm_actions(
+            action_attributes={"utterances": ["hand over"]}
+        )
+        results = index.most_similar(sub_graphs[0], k=1)
+        self.assertEqual(results[0][0], self.mtm_action)
+
+    def test_refresh(self):
+        index = similarity.PatternIndex(self.md.graph)
+        score = index.most_similar(self.stm_action, k=1)[0][1]
+        # completing the mtm pattern makes it more similar to the observed one
+        for link_type, uuid in [
+            ("has_actor", "65818e866eccd773b15e89d8"),
+            ("has_recipient", "658190c06eccd77ab5dc84d5"),
+        ]:
+            self.md.create_linked_node(
+                {"uuid": self.mtm_action}, {"uuid": uuid}, link_type=link_type
+            )
+        index.refresh(["65818e866eccd773b15e89d8", "658190c06eccd77ab5dc84d5"])
+        self.assertGreater(index.most_similar(self.stm_action, k=1)[0][1], score)
+
+    def test_refresh_deleted(self):
+        index = similarity.PatternIndex(self.md.graph)
+        self.md.delete_sub_graphs([self.md.graph.subgraph([self.mtm_object])])
+        index.refresh([self.mtm_object])
+        fresh = similarity.PatternIndex(self.md.graph)
+        self.assertAlmostEqual(
+            index.most_similar(self.stm_action, k=1)[0][1],
+            fresh.most_similar(self.stm_action, k=1)[0][1],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Custom package settings
+#
+# Copyright (C) 2023, Honda Research Institute Europe GmbH.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     (1) Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     (2) Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#
+#     (3)The name of the author may not be used to
+#     endorse or promote products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+import networkx as nx
+from basicmemnet import memnet
+from basicmemnet import sqlite_store
+
+
+class TestSQLiteDSL(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.temp_dir.name, "memory.db")
+        self.json_file = os.path.join(sys.path[0], "data", "action_patterns.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_mtm_action(self):
+        md = sqlite_store.SQLiteDSL(self.database, json_file=self.json_file)
+        sub_graphs = md.get_stm_actions(
+            action_attributes={"utterances": ["hand over"]},
+            object_attributes={"utterances": ["glass"]},
+        )
+        self.assertEqual(len(sub_graphs), 1)
+        self.assertEqual(len(sub_graphs[0]), 4)
+
+    def test_reopen(self):
+        md = sqlite_store.SQLiteDSL(self.database, json_file=self.json_file)
+        sub_graphs = md.get_stm_objects(object_attributes={"utterances": ["glass"]})
+        md.graph.close()
+        md = sqlite_store.SQLiteDSL(self.database)
+        reopened = md.get_stm_objects(object_attributes={"utterances": ["glass"]})
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(set(reopened[0].edges), set(sub_graphs[0].edges))
+
+        md.delete_sub_graphs(reopened)
+        for node in reopened[0]:
+            self.assertNotIn(node, md.graph)
+        self.assertFalse(
+            md.get_stm_objects(object_attributes={"utterances": ["glass"]})
+        )
+
+    def test_snapshot(self):
+        md = sqlite_store.SQLiteDSL(self.database, json_file=self.json_file)
+        md.snapshot_interval = 0.0
+        attributes = {"object_attributes": {"utterances": ["glass"]}}
+        snapshot = md.snapshot()
+        md.delete_sub_graphs(md.get_stm_objects(**attributes))
+        self.assertEqual(len(snapshot.get_stm_objects(**attributes)), 1)
+        self.assertEqual(len(md.snapshot().get_stm_objects(**attributes)), 0)
+        with self.assertRaises(sqlite3.OperationalError):
+            snapshot.create_linked_node(None, {"type": "action"})
+        snapshot.graph.close()
+
+    def test_import_gml(self):
+        md = sqlite_store.SQLiteDSL(self.database, json_file=self.json_file)
+        graph_file = os.path.join(
+            sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+        )
+        md.import_gml(graph_file)
+        self.assertFalse(
+            md.get_stm_objects(object_attributes={"utterances": ["glass"]})
+        )
+        self.assertEqual(len(md.graph), len(nx.read_gml(graph_file)))
+        # more than 999 sqlite parameters when deleted in one statement
+        nodes = list(md.graph)[:700]
+        md.graph.remove_nodes_from(nodes)
+        self.assertEqual(len(md.graph), len(nx.read_gml(graph_file)) - 700)
+        md.graph.close()
+
+    def test_explain(self):
+        md = sqlite_store.SQLiteDSL(self.database, json_file=self.json_file)
+        attributes = {
+            "action_attributes": {"utterances": ["hand over"]},
+            "object_attributes": {"utterances": ["glass"]},
+        }
+        explanation = md.explain(memory="stm", **attributes)
+        self.assertEqual(explanation.rows, 1)
+        self.assertTrue(
+            any(step.access().startswith("SEARCH") for step in explanation.steps)
+        )
+        self.assertIn("rows: 1", str(explanation))
+        md.graph.close()
+
+    def test_episodes(self):
+        graph_file = os.path.join(
+            sys.path[0], "data", "action_sequences", "action_sequences_test.gml"
+        )
+        md = memnet.DSL()
+        md.import_gml(graph_file)
+        sd = sqlite_store.SQLiteDSL(self.database, cache_size=100)
+        sd.import_gml(graph_file)
+        attributes = {
+            "action_attributes": {"utterances": ["pour"]},
+            "object_attributes": {"utterances": ["bowl"]},
+        }
+        expected = md.get_stm_actions(**attributes)
+        sub_graphs = sd.get_stm_actions(**attributes)
+        self.assertEqual(
+            sorted(sorted(sub_graph.edges) for sub_graph in sub_graphs),
+            sorted(sorted(sub_graph.edges) for sub_graph in expected),
+        )
+        self.assertLessEqual(len(sd.graph._cache), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()